@@ -1,63 +1,264 @@
 import acoustid
-import requests
-from pydub import AudioSegment
+import aiohttp
+import asyncio
+import orjson
 import tempfile
 import os
 import base64
+import hashlib
 import subprocess
+import argparse
+import functools
+import gzip
+from urllib.parse import urlencode
 
 ACOUSTID_API_KEY = "YjBc2sAt2S"
+ACOUSTID_LOOKUP_URL = "https://api.acoustid.org/v2/lookup"
+ACOUSTID_CACHE_DIR = ".acoustid_cache"
+# Segundos de audio analizados por huella (el mismo valor por defecto que fpcalc)
+FINGERPRINT_MAX_LENGTH = 120
+# Respuestas de AcoustID que se mantienen en memoria además de la caché de disco
+LOOKUP_MEMO_SIZE = 1024
 
-def generate_fingerprint(audio_path):
+# Sesión HTTP compartida por todas las búsquedas (conexiones keep-alive). Una sesión de
+# aiohttp solo sirve en su bucle de eventos, así que se guarda una por bucle: las funciones
+# síncronas usan un bucle temporal sin tocar la sesión del bucle principal
+_http_sessions = {}
+_lookup_memo = {}
+
+def get_http_session():
+    """
+    Devuelve la sesión HTTP compartida del bucle de eventos actual, creándola en el primer uso
+    """
+    loop = asyncio.get_running_loop()
+    session = _http_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=32)
+        )
+        _http_sessions[loop] = session
+    return session
+
+async def close_http_session():
     """
-    Genera el fingerprint usando fpcalc
+    Cierra la sesión HTTP compartida del bucle de eventos actual si está abierta
     """
+    session = _http_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+def _run_sync(coro):
+    """
+    Ejecuta una búsqueda asíncrona desde código síncrono y cierra la sesión de su bucle al terminar
+    """
+    async def run():
+        try:
+            return await coro
+        finally:
+            await close_http_session()
+    return asyncio.run(run())
+
+def generate_fingerprint(audio):
+    """
+    Genera el fingerprint del audio.
+    `audio` puede ser la ruta al archivo o sus bytes. Las rutas se procesan en el mismo
+    proceso con libchromaprint (acoustid.fingerprint_file, que solo recurre a fpcalc si
+    la librería no está instalada); los bytes se envían a fpcalc por stdin sin escribir
+    el archivo a disco.
+    """
+    if not isinstance(audio, (bytes, bytearray)):
+        stat = os.stat(audio)
+        return _fingerprint_file(os.path.abspath(audio), stat.st_mtime_ns, stat.st_size)
+    
     try:
         # Ejecutar fpcalc sin -raw para obtener el fingerprint en formato comprimido
         result = subprocess.run(
-            ['fpcalc', '-json', audio_path],
+            ['fpcalc', '-json', '-'],
+            input=audio,
             capture_output=True,
-            text=True,
             check=True
         )
         
         # Parsear salida JSON
-        import json
-        data = json.loads(result.stdout)
+        data = orjson.loads(result.stdout)
         
         # El fingerprint ya viene en el formato correcto (base64)
         return data['duration'], data['fingerprint']
     
     except subprocess.CalledProcessError as e:
-        raise Exception(f"fpcalc error: {e.stderr}")
+        raise Exception(f"fpcalc error: {e.stderr.decode(errors='replace')}")
     except Exception as e:
         raise Exception(f"Error processing file: {str(e)}")
 
-def acoustid_lookup(fingerprint, duration, meta="recordings"):
+@functools.lru_cache(maxsize=1024)
+def _fingerprint_file(path, mtime_ns, size):
+    """
+    Huella de un archivo en disco, memorizada por ruta, fecha de modificación y tamaño
+    para que volver a procesar el mismo archivo no cueste nada
+    """
+    try:
+        duration, fingerprint = acoustid.fingerprint_file(path, maxlength=FINGERPRINT_MAX_LENGTH)
+        return duration, fingerprint.decode()
+    except acoustid.FingerprintGenerationError as e:
+        raise Exception(f"Error processing file: {str(e)}")
+
+def _fingerprint_cache_key(fingerprint, duration):
+    """
+    Clave de caché para una huella: hash del fingerprint más la duración redondeada
+    """
+    digest = hashlib.blake2b(fingerprint.encode(), digest_size=16).hexdigest()
+    return f"{digest}{int(float(duration))}"
+
+def _read_cache(key):
+    """
+    Devuelve la respuesta cacheada para la clave o None si no existe.
+    Se consulta primero la memoria del proceso y después la caché de disco.
+    """
+    data = _lookup_memo.get(key)
+    if data is not None:
+        return data
+    try:
+        with open(os.path.join(ACOUSTID_CACHE_DIR, f"{key}.json"), "rb") as f:
+            data = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    _remember(key, data)
+    return data
+
+def _remember(key, data):
+    """
+    Guarda la respuesta en la memoria del proceso descartando la más antigua si está llena
+    """
+    if len(_lookup_memo) >= LOOKUP_MEMO_SIZE:
+        _lookup_memo.pop(next(iter(_lookup_memo)))
+    _lookup_memo[key] = data
+
+def _write_cache(key, data):
+    """
+    Guarda la respuesta completa de AcoustID en la caché de disco
+    """
+    if data.get("status") != "ok":
+        return
+    _remember(key, data)
+    os.makedirs(ACOUSTID_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(ACOUSTID_CACHE_DIR, f"{key}.json"), "wb") as f:
+        f.write(orjson.dumps(data))
+
+# Cabeceras para enviar el formulario de búsqueda comprimido con gzip
+LOOKUP_POST_HEADERS = {
+    "Content-Encoding": "gzip",
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Accept-Encoding": "gzip"
+}
+
+def _lookup_body(params):
+    """
+    Codifica los parámetros de búsqueda como formulario comprimido con gzip.
+    Las huellas ocupan varios KB en base64, así que viajan en el cuerpo de un POST
+    en lugar de en la URL.
+    """
+    return gzip.compress(urlencode(params).encode())
+
+def acoustid_lookup(fingerprint, duration, meta="recordings", use_cache=True):
+    """
+    Realiza una búsqueda en la base de datos de AcoustID (envoltorio síncrono de acoustid_lookup_async)
+    """
+    return _run_sync(acoustid_lookup_async(fingerprint, duration, meta, use_cache))
+
+async def acoustid_lookup_async(fingerprint, duration, meta="recordings", use_cache=True):
     """
-    Realiza una búsqueda en la base de datos de AcoustID
+    Realiza una búsqueda en la base de datos de AcoustID reutilizando la sesión HTTP compartida
     """
+    cache_key = _fingerprint_cache_key(fingerprint, duration)
+    if use_cache:
+        cached = _read_cache(cache_key)
+        if cached is not None:
+            return cached
+    
     params = {
-        "client": "YjBc2sAt2S",
+        "client": ACOUSTID_API_KEY,
         "duration": str(int(float(duration))),
         "fingerprint": fingerprint,
-        "meta": "recordings"
+        "meta": meta
     }
     
     try:
-        response = requests.get(
-            "https://api.acoustid.org/v2/lookup",
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        async with get_http_session().post(
+            ACOUSTID_LOOKUP_URL,
+            data=_lookup_body(params),
+            headers=LOOKUP_POST_HEADERS
+        ) as response:
+            response.raise_for_status()
+            data = orjson.loads(await response.read())
+    except aiohttp.ClientError as e:
         raise Exception(f"HTTP request error: {str(e)}")
+    
+    _write_cache(cache_key, data)
+    return data
 
-def analyze_song(audio_path):
+async def acoustid_lookup_batch_async(items, meta="recordings", use_cache=True):
+    """
+    Consulta varias huellas en una sola petición (parámetros duration.N / fingerprint.N).
+    `items` es una lista de tuplas (duración, fingerprint); devuelve una respuesta por huella,
+    en el mismo orden y con el mismo formato que acoustid_lookup_async.
+    """
+    keys = [_fingerprint_cache_key(fingerprint, duration) for duration, fingerprint in items]
+    responses = [None] * len(items)
+    pending = []
+    for i, key in enumerate(keys):
+        cached = _read_cache(key) if use_cache else None
+        if cached is not None:
+            responses[i] = cached
+        else:
+            pending.append(i)
+    
+    if not pending:
+        return responses
+    
+    params = {
+        "client": ACOUSTID_API_KEY,
+        "meta": meta
+    }
+    for n, i in enumerate(pending):
+        duration, fingerprint = items[i]
+        params[f"duration.{n}"] = str(int(float(duration)))
+        params[f"fingerprint.{n}"] = fingerprint
+    
+    try:
+        async with get_http_session().post(
+            ACOUSTID_LOOKUP_URL,
+            data=_lookup_body(params),
+            headers=LOOKUP_POST_HEADERS
+        ) as response:
+            response.raise_for_status()
+            data = orjson.loads(await response.read())
+    except aiohttp.ClientError as e:
+        raise Exception(f"HTTP request error: {str(e)}")
+    
+    if data.get("status") != "ok":
+        for i in pending:
+            responses[i] = data
+        return responses
+    
+    # Cada huella llega con su índice dentro de la petición; con una sola huella
+    # AcoustID puede responder en el formato simple con "results"
+    entries = data.get("fingerprints")
+    if entries is None:
+        entries = [{"index": 0, "results": data.get("results")}] if len(pending) == 1 else ()
+    for entry in entries:
+        i = pending[int(entry["index"])]
+        responses[i] = {"status": "ok", "results": entry.get("results") or []}
+        _write_cache(keys[i], responses[i])
+    
+    for i in pending:
+        if responses[i] is None:
+            responses[i] = {"status": "ok", "results": []}
+    return responses
+
+def analyze_song(audio_path, use_cache=True):
     # Procesar solo la canción completa
     duration, fingerprint = generate_fingerprint(audio_path)
-    result = acoustid_lookup(fingerprint, duration)
+    result = acoustid_lookup(fingerprint, duration, use_cache=use_cache)
     
     return {
         "full_track": process_results(result)
@@ -67,10 +268,20 @@ def process_results(data):
     """
     Procesa los resultados de la API para extraer información relevante
     """
-    if data.get("status") != "ok" or not data.get("results"):
+    if data.get("status") != "ok":
         return None
     
-    best_result = max(data["results"], key=lambda x: x.get("score", 0))
+    # Una sola pasada sobre los candidatos quedándonos solo con el de mayor score
+    best_result = None
+    best_score = -1.0
+    for candidate in data.get("results") or ():
+        score = candidate.get("score") or 0.0
+        if score > best_score:
+            best_score = score
+            best_result = candidate
+    
+    if best_result is None:
+        return None
     
     # Si no hay recordings pero sí hay un ID, devolver lo que tenemos
     if not best_result.get("recordings"):
@@ -86,17 +297,12 @@ def process_results(data):
         "acoustid": best_result.get("id"),
         "score": best_result.get("score"),
         "title": recording.get("title"),
-        "artists": [artist["name"] for artist in recording.get("artists", [])],
+        "artists": [artist["name"] for artist in recording.get("artists") or ()],
         "duration": recording.get("duration"),
         "recording_id": recording.get("id"),
-        "releases": [],
-        "release_groups": []
-    }
-    
-    # Procesar información de releases
-    if recording.get("releases"):
-        for release in recording["releases"]:
-            release_info = {
+        # Información de releases
+        "releases": [
+            {
                 "title": release.get("title"),
                 "id": release.get("id"),
                 "date": release.get("date"),
@@ -104,48 +310,75 @@ def process_results(data):
                 "medium_count": release.get("medium_count"),
                 "track_count": release.get("track_count")
             }
-            result["releases"].append(release_info)
-    
-    # Procesar información de release groups
-    if recording.get("releasegroups"):
-        for group in recording["releasegroups"]:
-            group_info = {
+            for release in recording.get("releases") or ()
+        ],
+        # Información de release groups
+        "release_groups": [
+            {
                 "title": group.get("title"),
                 "id": group.get("id"),
                 "type": group.get("type")
             }
-            result["release_groups"].append(group_info)
+            for group in recording.get("releasegroups") or ()
+        ]
+    }
     
     return result
 
-def lookup_by_track_id(track_id):
+def lookup_by_track_id(track_id, meta="recordings", use_cache=True):
+    """
+    Búsqueda por ID de pista (envoltorio síncrono de lookup_by_track_id_async)
+    """
+    return _run_sync(lookup_by_track_id_async(track_id, meta, use_cache))
+
+async def lookup_by_track_id_async(track_id, meta="recordings", use_cache=True):
     """
-    Búsqueda por ID de pista
+    Búsqueda por ID de pista reutilizando la sesión HTTP compartida
     """
+    cache_key = f"track_{track_id}"
+    if use_cache:
+        cached = _read_cache(cache_key)
+        if cached is not None:
+            return cached
+    
     params = {
-        "client": "YjBc2sAt2S",
+        "client": ACOUSTID_API_KEY,
         "trackid": track_id,
-        "meta": "recordings"
+        "meta": meta
     }
     
     try:
-        response = requests.get(
-            "https://api.acoustid.org/v2/lookup",
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        async with get_http_session().get(ACOUSTID_LOOKUP_URL, params=params) as response:
+            response.raise_for_status()
+            data = orjson.loads(await response.read())
+    except aiohttp.ClientError as e:
         raise Exception(f"HTTP request error: {str(e)}")
+    
+    _write_cache(cache_key, data)
+    return data
 
 # Uso ejemplo
 if __name__ == "__main__":
-    audio_file = r"C:\Users\Nicolas\Documents\ShazamProject\kerri_chandler_track.mp3"  # Reemplazar con tu archivo
+    parser = argparse.ArgumentParser(description="Identifica una canción con AcoustID")
+    parser.add_argument(
+        "audio_file",
+        nargs="?",
+        default=r"C:\Users\Nicolas\Documents\ShazamProject\kerri_chandler_track.mp3",  # Reemplazar con tu archivo
+        help="Ruta al archivo de audio a identificar"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignora la caché local de respuestas de AcoustID"
+    )
+    args = parser.parse_args()
+    audio_file = args.audio_file
+    use_cache = not args.no_cache
     
     if not os.path.exists(audio_file):
         raise FileNotFoundError(f"File {audio_file} not found")
     
-    results = analyze_song(audio_file)
+    results = analyze_song(audio_file, use_cache=use_cache)
     
     print("\nResults for complete song:")
     if results["full_track"]:
@@ -170,6 +403,6 @@ if __name__ == "__main__":
         
         if track.get("acoustid"):
             track_id = track["acoustid"]
-            id_results = lookup_by_track_id(track_id)
+            id_results = lookup_by_track_id(track_id, use_cache=use_cache)
     else:
         print("No song identified")
\ No newline at end of file
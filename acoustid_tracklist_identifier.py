@@ -1,4 +1,5 @@
 import os
+import glob
 import asyncio
 import traceback
 import yt_dlp
@@ -6,8 +7,9 @@ import logging
 import time
 import random
 import subprocess
-import requests
-from pydub import AudioSegment
+import tempfile
+from acoustid_client import generate_fingerprint, acoustid_lookup_batch_async, close_http_session
+from recognizers.utils import tmp_root
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,55 +18,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def generate_fingerprint(audio_path):
-    logger.info(f"Generating fingerprint for {audio_path}")
-    try:
-        result = subprocess.run(
-            ['fpcalc', '-json', audio_path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        
-        import json
-        data = json.loads(result.stdout)
-        logger.info(f"Fingerprint generated successfully")
-        return data['duration'], data['fingerprint']
-    
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"fpcalc error: {e.stderr}")
-    except Exception as e:
-        raise Exception(f"Error processing file: {str(e)}")
+# AcoustID permite 3 peticiones por segundo por cliente
+ACOUSTID_REQUESTS_PER_SECOND = 3
+MAX_CONCURRENT_CHUNKS = 6
+# Huellas enviadas en cada petición de búsqueda a AcoustID
+ACOUSTID_BATCH_SIZE = 5
 
-def acoustid_lookup(fingerprint, duration):
-    params = {
-        "client": "YjBc2sAt2S",
-        "duration": str(int(float(duration))),
-        "fingerprint": fingerprint,
-        "meta": "recordings"
-    }
-    logger.info(f"Trying to get data from acoustid...")
-    try:
-        response = requests.get(
-            "https://api.acoustid.org/v2/lookup",
-            params=params
-        )
-        logger.info(f"Response is {response.text}")
-        if response.status_code == 200:
-            logger.info(f"Data received from acoustid")
-            return response.json()
-        else:
-            logger.error(f"Error getting data from acoustid: {response.status_code}")
-            return None
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"HTTP request error: {str(e)}")
+# Instancia de yt-dlp reutilizada entre descargas. Se baja el audio en su contenedor
+# original, sin recodificar a MP3: el único paso de ffmpeg es el de split_audio.
+_YDL = yt_dlp.YoutubeDL({
+    'format': 'bestaudio[ext=m4a]/bestaudio/best',
+    'outtmpl': '%(id)s.%(ext)s',
+    'quiet': True,
+})
+
+class RateLimiter:
+    """Token bucket compartido por todas las corutinas que consultan AcoustID"""
+    def __init__(self, max_rate, time_period=1.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = max_rate
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                elapsed = now - self._last_refill
+                self._last_refill = now
+                self._tokens = min(
+                    self.max_rate,
+                    self._tokens + elapsed * self.max_rate / self.time_period
+                )
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.time_period / self.max_rate)
 
 def process_acoustid_results(data):
     logger.info(f"Processing acoustid results")
-    if data.get("status") != "ok" or not data.get("results"):
+    if data.get("status") != "ok":
         return None
     
-    best_result = max(data["results"], key=lambda x: x.get("score", 0))
+    best_result = None
+    best_score = -1.0
+    for candidate in data.get("results") or ():
+        score = candidate.get("score") or 0.0
+        if score > best_score:
+            best_score = score
+            best_result = candidate
+    
+    if best_result is None:
+        return None
     
     if not best_result.get("recordings"):
         return {
@@ -79,15 +85,35 @@ def process_acoustid_results(data):
         "acoustid": best_result.get("id"),
         "score": best_result.get("score"),
         "title": recording.get("title"),
-        "artists": [artist["name"] for artist in recording.get("artists", [])]
+        "artists": [artist["name"] for artist in recording.get("artists") or ()]
     }
 
-async def recognize_with_acoustid(chunk_path):
+async def fingerprint_chunk(chunk_path):
     try:
-        duration, fingerprint = generate_fingerprint(chunk_path)
-        logger.info("Waiting 4 seconds before making request...")
-        await asyncio.sleep(4)
-        result = acoustid_lookup(fingerprint, duration)
+        logger.info(f"Generating fingerprint for {chunk_path}")
+        return await asyncio.to_thread(generate_fingerprint, chunk_path)
+    except Exception as e:
+        logger.error(f"Error generating fingerprint for {chunk_path}: {str(e)}")
+        return None
+
+async def recognize_batch_with_acoustid(chunk_paths, semaphore, rate_limiter):
+    # Todas las huellas del lote se consultan en una sola petición (un único token del limitador)
+    fingerprints = await asyncio.gather(*(fingerprint_chunk(chunk) for chunk in chunk_paths))
+    indexes = [i for i, fp in enumerate(fingerprints) if fp is not None]
+    processed_results = [None] * len(chunk_paths)
+    if not indexes:
+        return processed_results
+    
+    try:
+        async with semaphore:
+            await rate_limiter.acquire()
+            logger.info(f"Trying to get data from acoustid for {len(indexes)} chunks...")
+            responses = await acoustid_lookup_batch_async([fingerprints[i] for i in indexes])
+    except Exception as e:
+        logger.error(f"Error in AcoustID recognition: {str(e)}")
+        return processed_results
+    
+    for i, result in zip(indexes, responses):
         processed_result = process_acoustid_results(result)
         
         if processed_result:
@@ -96,77 +122,86 @@ async def recognize_with_acoustid(chunk_path):
             print(f"Title: {processed_result.get('title', 'Unknown')}")
             print(f"Artists: {', '.join(processed_result.get('artists', ['Unknown']))}")
         
-        return processed_result
-    except Exception as e:
-        logger.error(f"Error in AcoustID recognition: {str(e)}")
-        return None
+        processed_results[i] = processed_result
+    return processed_results
 
 def download_audio(url):
     logger.info(f"Starting audio download from URL: {url}")
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'outtmpl': 'downloaded_audio.%(ext)s',
-        'quiet': True,
-    }
-    
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            filename = ydl.prepare_filename(info)
-            base, ext = os.path.splitext(filename)
-            final_filename = f"{base}.mp3"
-            logger.info(f"Audio downloaded to: {final_filename}")
-            return final_filename, info.get('title', 'Unknown')
+        info = _YDL.extract_info(url, download=True)
+        filename = _YDL.prepare_filename(info)
+        logger.info(f"Audio downloaded to: {filename}")
+        return filename, info.get('title', 'Unknown')
     except Exception as e:
         logger.error(f"Error during audio download: {str(e)}")
         raise
 
-def split_audio(audio_path, chunk_duration=60):
+def get_audio_duration(audio_path):
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+         '-of', 'default=noprint_wrappers=1:nokey=1', audio_path],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return int(float(result.stdout.strip()))
+
+def split_audio(audio_path, chunk_duration=60, output_dir="."):
     logger.info(f"Splitting audio from {audio_path} into chunks of {chunk_duration} seconds")
     try:
-        audio = AudioSegment.from_file(audio_path)
-        chunk_ms = chunk_duration * 1000
-        chunks = []
-        
-        for i in range(0, len(audio), chunk_ms):
-            chunk = audio[i:i + chunk_ms]
-            chunk_name = f"chunk_{i//1000:04d}.mp3"
-            chunk.export(chunk_name, format="mp3")
-            chunks.append(chunk_name)
+        # Un solo proceso ffmpeg genera todos los segmentos: si la fuente ya es MP3 copia
+        # los frames sin recodificar, si no la transcodifica una única vez
+        if audio_path.lower().endswith('.mp3'):
+            codec_args = ['-c', 'copy']
+        else:
+            # Mono a 16 kHz y 64 kbps: suficiente para Chromaprint, que trabaja a 11025 Hz
+            codec_args = ['-vn', '-c:a', 'libmp3lame', '-ac', '1', '-ar', '16000', '-b:a', '64k']
+        subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', audio_path,
+             '-f', 'segment', '-segment_time', str(chunk_duration), *codec_args,
+             '-reset_timestamps', '1', os.path.join(output_dir, 'chunk_%04d.mp3')],
+            check=True
+        )
+        chunks = sorted(glob.glob(os.path.join(output_dir, 'chunk_*.mp3')))
         logger.info(f"Split audio into {len(chunks)} chunks")
-        return chunks, len(audio) // 1000
+        return chunks, get_audio_duration(audio_path)
     except Exception as e:
         logger.error(f"Error splitting audio: {str(e)}")
         raise
 
-async def process_chunk(chunk_path):
-    result = await recognize_with_acoustid(chunk_path)
-    print(f"\nResults for chunk {chunk_path}:")
-    print("=" * 50)
-    return result
+async def process_batch(chunk_paths, semaphore, rate_limiter):
+    results = await recognize_batch_with_acoustid(chunk_paths, semaphore, rate_limiter)
+    for chunk_path in chunk_paths:
+        print(f"\nResults for chunk {chunk_path}:")
+        print("=" * 50)
+    return results
 
 async def main(url, chunk_duration=60):
     try:
         audio_path, video_title = await asyncio.to_thread(download_audio, url)
-        chunks, total_duration = split_audio(audio_path, chunk_duration)
         
-        print(f"\nProcessing {len(chunks)} chunks of {chunk_duration} seconds each...")
-        for chunk in chunks:
-            await process_chunk(chunk)
+        # Los chunks viven en un directorio temporal que se borra entero al salir,
+        # también si el proceso falla a mitad
+        # tmp_root() elige tmpfs solo si le queda espacio (o TRACKFINDER_TMPDIR si está definido)
+        with tempfile.TemporaryDirectory(dir=tmp_root()) as chunks_dir:
+            chunks, total_duration = split_audio(audio_path, chunk_duration, chunks_dir)
+            
+            print(f"\nProcessing {len(chunks)} chunks of {chunk_duration} seconds each...")
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHUNKS)
+            rate_limiter = RateLimiter(ACOUSTID_REQUESTS_PER_SECOND)
+            await asyncio.gather(
+                *(process_batch(chunks[i:i + ACOUSTID_BATCH_SIZE], semaphore, rate_limiter)
+                  for i in range(0, len(chunks), ACOUSTID_BATCH_SIZE))
+            )
         
         # Cleanup
         os.remove(audio_path)
-        for chunk in chunks:
-            os.remove(chunk)
             
     except Exception as e:
         logger.error(f"Error in main process: {str(e)}")
         logger.error(traceback.format_exc())
+    finally:
+        await close_http_session()
 
 if __name__ == "__main__":
     # Prueba con Around the World de Daft Punk
@@ -1,16 +1,20 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, HttpUrl
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict, HttpUrl, TypeAdapter
 from typing import List, Optional, Dict, Any
 import asyncio
+import functools
 import uuid
 import logging
-import traceback
-import requests
+import aiohttp
+import orjson
+import time
+from collections import OrderedDict
 from datetime import datetime
 import os
+from pathlib import Path
 from dotenv import load_dotenv
-import discogs_client
 
 # Importamos nuestra nueva arquitectura
 from recognizers.manager import TrackRecognitionManager
@@ -27,27 +31,164 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Configuración de Discogs
-DISCOGS_API_URL = "https://api.discogs.com/database/search"
-DISCOGS_RELEASE_URL = "https://api.discogs.com/releases"
+DISCOGS_BASE_URL = "https://api.discogs.com"
+DISCOGS_SEARCH_PATH = "/database/search"
+DISCOGS_RELEASE_PATH = "/releases"
+DISCOGS_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# Caché de respuestas de Discogs (segundos de validez de cada entrada)
+DISCOGS_RELEASE_CACHE_TTL = 3600
+DISCOGS_SEARCH_CACHE_TTL = 300
+# Validar los releases contra DiscogsReleaseResponse antes de devolverlos (por defecto se
+# reenvía el JSON de Discogs tal cual, sin pasar por pydantic)
+DISCOGS_VALIDATE_RELEASES = os.getenv("DISCOGS_VALIDATE_RELEASES") == "1"
+# Si se define, la caché se comparte entre workers a través de Redis
+REDIS_URL = os.getenv("REDIS_URL")
 DISCOGS_USER_AGENT = os.getenv("DISCOGS_USER_AGENT")
 DISCOGS_CONSUMER_KEY = os.getenv("DISCOGS_CONSUMER_KEY")
 DISCOGS_CONSUMER_SECRET = os.getenv("DISCOGS_CONSUMER_SECRET")
+# Cabeceras de autenticación, construidas una sola vez al importar el módulo
+DISCOGS_HEADERS = {
+    "User-Agent": DISCOGS_USER_AGENT,
+    "Accept": "application/json",
+    "Authorization": f"Discogs key={DISCOGS_CONSUMER_KEY}, secret={DISCOGS_CONSUMER_SECRET}"
+}
+
+# Duración de chunk por defecto y reconocedores que se preparan al arrancar
+DEFAULT_CHUNK_DURATION = 30
+PREWARMED_RECOGNIZERS = ["shazam", "acoustid"]
 
 # Configuración del track_finder.exe
 TRACK_FINDER_PATH = os.getenv("TRACK_FINDER_PATH", "./track_finder.exe")
 
-d = discogs_client.Client(
-    DISCOGS_USER_AGENT,
-    consumer_key=DISCOGS_CONSUMER_KEY,
-    consumer_secret=DISCOGS_CONSUMER_SECRET
-)
-
 app = FastAPI(
     title="DJ Track Identifier API",
     description="API para identificar tracks en mixes y sets de DJ",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Sesión HTTP compartida para las peticiones a Discogs (se crea al arrancar la app).
+# Lleva la URL base y la autenticación, así que cada petición solo indica ruta y parámetros.
+http_session: Optional[aiohttp.ClientSession] = None
+
+class TTLCache:
+    """Caché LRU en memoria en la que cada entrada caduca pasados `ttl` segundos"""
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+release_cache = TTLCache(maxsize=2048, ttl=DISCOGS_RELEASE_CACHE_TTL)
+search_cache = TTLCache(maxsize=1024, ttl=DISCOGS_SEARCH_CACHE_TTL)
+
+# Cliente de Redis opcional (solo si está configurado REDIS_URL)
+redis_client = None
+
+# Reconocimientos en curso, para que peticiones idénticas simultáneas compartan
+# una única descarga y un único análisis
+inflight_identifications: Dict[tuple, asyncio.Task] = {}
+
+def finish_identification(key: tuple, task: asyncio.Task) -> None:
+    """
+    Retira el reconocimiento terminado de los que están en curso y recoge su excepción:
+    si todos los clientes se desconectaron nadie la lee y asyncio avisaría de
+    "Task exception was never retrieved".
+    """
+    inflight_identifications.pop(key, None)
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.error("El reconocimiento compartido %s terminó con error: %s", key, error)
+
+async def read_json(response: aiohttp.ClientResponse):
+    """Lee el cuerpo completo de la respuesta como bytes y lo decodifica con orjson"""
+    return orjson.loads(await response.read())
+
+async def cache_get(cache: TTLCache, key: str):
+    """Busca una respuesta en la caché local y, si no está, en Redis"""
+    value = cache.get(key)
+    if value is not None or redis_client is None:
+        return value
+    try:
+        raw = await redis_client.get(key)
+    except Exception as e:
+        logger.warning(f"Error leyendo de Redis: {str(e)}")
+        return None
+    if raw is None:
+        return None
+    value = orjson.loads(raw)
+    cache.set(key, value)
+    return value
+
+async def cache_set(cache: TTLCache, key: str, value):
+    """Guarda una respuesta en la caché local y en Redis si está disponible"""
+    cache.set(key, value)
+    if redis_client is None:
+        return
+    try:
+        await redis_client.setex(key, int(cache.ttl), orjson.dumps(value))
+    except Exception as e:
+        logger.warning(f"Error escribiendo en Redis: {str(e)}")
+
+@app.on_event("startup")
+async def startup():
+    """Crea la sesión HTTP y el gestor de reconocimiento reutilizados entre peticiones"""
+    global http_session, redis_client
+    
+    # Las rutas de los ejecutables se validan una sola vez, no en cada petición
+    app.state.track_finder_path = str(Path(TRACK_FINDER_PATH).resolve(strict=False))
+    app.state.track_finder_ok = Path(app.state.track_finder_path).is_file()
+    executable_path = os.getenv("EXECUTABLE_RECOGNIZER_PATH")
+    app.state.executable_path = str(Path(executable_path).resolve(strict=False)) if executable_path else None
+    if not app.state.track_finder_ok:
+        logger.warning(f"El ejecutable 'track_finder.exe' no se encuentra en la ruta: {TRACK_FINDER_PATH}")
+    
+    app.state.manager = TrackRecognitionManager(output_dir="output")
+    await app.state.manager.prewarm(
+        PREWARMED_RECOGNIZERS,
+        {name: {"chunk_duration": DEFAULT_CHUNK_DURATION} for name in PREWARMED_RECOGNIZERS}
+    )
+    http_session = aiohttp.ClientSession(
+        base_url=DISCOGS_BASE_URL,
+        headers=DISCOGS_HEADERS,
+        timeout=DISCOGS_TIMEOUT,
+        connector=aiohttp.TCPConnector(limit=100, limit_per_host=32)
+    )
+    if REDIS_URL:
+        try:
+            import redis.asyncio as redis
+            redis_client = redis.from_url(REDIS_URL)
+        except ImportError:
+            logger.warning("REDIS_URL está configurado pero el paquete 'redis' no está instalado")
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Cierra la sesión HTTP compartida y los reconocedores"""
+    await app.state.manager.aclose()
+    if http_session is not None:
+        await http_session.close()
+    if redis_client is not None:
+        await redis_client.aclose()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # URL de tu frontend Next.js
@@ -60,7 +201,7 @@ class TrackIdentificationRequest(BaseModel):
     url: HttpUrl
     platform: str
     recognizers: Optional[List[str]] = ["shazam"]  # Por defecto usa solo Shazam
-    chunk_duration: Optional[int] = 30
+    chunk_duration: Optional[int] = DEFAULT_CHUNK_DURATION
 
 class Track(BaseModel):
     timestamp: str
@@ -70,6 +211,9 @@ class Track(BaseModel):
     confidence: float
     recognizer: Optional[str] = None
 
+# Valida la lista completa de tracks en una sola llamada a pydantic-core
+TRACKS_ADAPTER = TypeAdapter(List[Track])
+
 class TrackIdentificationResponse(BaseModel):
     id: str
     tracks: List[Track]
@@ -81,7 +225,11 @@ class DiscogsSearchRequest(BaseModel):
     per_page: Optional[int] = 10
     page: Optional[int] = 1
 
-class DiscogsTrack(BaseModel):
+class DiscogsModel(BaseModel):
+    """Base de los modelos de respuesta de Discogs: ignoran campos extra y no se modifican tras crearse"""
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+class DiscogsTrack(DiscogsModel):
     title: str
     artist: str
     year: Optional[str] = None
@@ -93,11 +241,11 @@ class DiscogsTrack(BaseModel):
     resource_url: str
     id: int
 
-class DiscogsSearchResponse(BaseModel):
+class DiscogsSearchResponse(DiscogsModel):
     pagination: dict
     results: List[DiscogsTrack]
 
-class DiscogsArtist(BaseModel):
+class DiscogsArtist(DiscogsModel):
     id: int
     name: str
     resource_url: str
@@ -106,7 +254,7 @@ class DiscogsArtist(BaseModel):
     role: Optional[str] = ""
     tracks: Optional[str] = ""
 
-class DiscogsCommunity(BaseModel):
+class DiscogsCommunity(DiscogsModel):
     have: int
     want: int
     rating: Dict[str, float]
@@ -115,7 +263,7 @@ class DiscogsCommunity(BaseModel):
     data_quality: str
     contributors: List[Dict[str, str]]
 
-class DiscogsCompany(BaseModel):
+class DiscogsCompany(DiscogsModel):
     id: int
     name: str
     resource_url: str
@@ -123,16 +271,16 @@ class DiscogsCompany(BaseModel):
     entity_type: Optional[str] = ""
     entity_type_name: Optional[str] = ""
 
-class DiscogsFormat(BaseModel):
+class DiscogsFormat(DiscogsModel):
     name: str
     qty: str
     descriptions: List[str]
 
-class DiscogsIdentifier(BaseModel):
+class DiscogsIdentifier(DiscogsModel):
     type: str
     value: str
 
-class DiscogsImage(BaseModel):
+class DiscogsImage(DiscogsModel):
     height: int
     width: int
     resource_url: str
@@ -140,27 +288,27 @@ class DiscogsImage(BaseModel):
     uri: str
     uri150: str
 
-class DiscogsLabel(BaseModel):
+class DiscogsLabel(DiscogsModel):
     id: int
     name: str
     resource_url: str
     catno: Optional[str] = ""
     entity_type: Optional[str] = ""
 
-class DiscogsTrack(BaseModel):
+class DiscogsReleaseTrack(DiscogsModel):
     position: str
     title: str
     duration: Optional[str] = None
     type_: Optional[str] = None
 
-class DiscogsVideo(BaseModel):
+class DiscogsVideo(DiscogsModel):
     description: str
     duration: int
     embed: bool
     title: str
     uri: str
 
-class DiscogsReleaseResponse(BaseModel):
+class DiscogsReleaseResponse(DiscogsModel):
     id: int
     title: str
     artists: List[DiscogsArtist]
@@ -190,11 +338,14 @@ class DiscogsReleaseResponse(BaseModel):
     series: List[Any] = []
     status: str
     styles: List[str]
-    tracklist: List[DiscogsTrack]
+    tracklist: List[DiscogsReleaseTrack]
     uri: str
     videos: List[DiscogsVideo]
     year: int
 
+# Validador del release precompilado una sola vez
+RELEASE_ADAPTER = TypeAdapter(DiscogsReleaseResponse)
+
 # Respuesta hardcodeada para pruebas
 HARDCODED_RESPONSE = {
     "id": "d2f7baea-f6d1-4baa-b25a-32905b1d848f",
@@ -252,11 +403,16 @@ HARDCODED_RESPONSE = {
     "totalTracks": 7
 }
 
+# La respuesta de prueba es constante: se valida y serializa una sola vez al importar el módulo.
+# El response_model se mantiene para la documentación; FastAPI no revalida un Response ya construido.
+HARDCODED_RESPONSE_BYTES = orjson.dumps(TrackIdentificationResponse(**HARDCODED_RESPONSE).model_dump())
+
 @app.post("/api/tracks/identify/url/test", response_model=TrackIdentificationResponse)
 async def identify_tracks_from_url_test(request: TrackIdentificationRequest):
     """Endpoint de prueba que devuelve una respuesta hardcodeada"""
-    logger.info(f"Endpoint de prueba llamado con URL: {request.url}")
-    return HARDCODED_RESPONSE
+    logger.debug("Endpoint de prueba llamado con URL: %s", request.url)
+    # Un Response nuevo por llamada: los middlewares (CORS) modifican sus headers en el lugar
+    return Response(content=HARDCODED_RESPONSE_BYTES, media_type="application/json")
 
 @app.post("/api/tracks/identify/url", response_model=TrackIdentificationResponse)
 async def identify_tracks_from_url(request: TrackIdentificationRequest):
@@ -264,13 +420,15 @@ async def identify_tracks_from_url(request: TrackIdentificationRequest):
     Identifica tracks en una URL utilizando los reconocedores especificados.
     """
     try:
-        logger.info(f"Iniciando identificación de tracks para URL: {request.url}")
+        # La URL se convierte a string una sola vez y se reutiliza en todo el handler
+        url = str(request.url)
+        logger.info(f"Iniciando identificación de tracks para URL: {url}")
         logger.info(f"Plataforma: {request.platform}")
         logger.info(f"Reconocedores: {request.recognizers}")
         logger.info(f"Duración de chunks: {request.chunk_duration}")
         
         # Verificar si la URL es válida
-        if not request.url:
+        if not url:
             raise HTTPException(status_code=400, detail="URL inválida")
         
         # Configurar parámetros específicos para reconocedores
@@ -282,16 +440,16 @@ async def identify_tracks_from_url(request: TrackIdentificationRequest):
             
             # Parámetros específicos para track_finder si se usa
             if recognizer == "track_finder":
-                if not os.path.exists(TRACK_FINDER_PATH):
+                if not app.state.track_finder_ok:
                     raise HTTPException(
                         status_code=500, 
                         detail=f"El ejecutable 'track_finder.exe' no se encuentra en la ruta: {TRACK_FINDER_PATH}"
                     )
-                recognizer_params[recognizer]["executable_path"] = TRACK_FINDER_PATH
+                recognizer_params[recognizer]["executable_path"] = app.state.track_finder_path
                 
             # Parámetros específicos para executable si se usa
             elif recognizer == "executable":
-                executable_path = os.getenv("EXECUTABLE_RECOGNIZER_PATH")
+                executable_path = app.state.executable_path
                 if not executable_path:
                     raise HTTPException(
                         status_code=500, 
@@ -299,110 +457,143 @@ async def identify_tracks_from_url(request: TrackIdentificationRequest):
                     )
                 recognizer_params[recognizer]["executable_path"] = executable_path
         
-        # Crear el gestor de reconocimiento
-        manager = TrackRecognitionManager(output_dir="output")
+        # Si ya hay un reconocimiento idéntico en curso, esperar a su resultado
+        key = (url, tuple(sorted(request.recognizers)), request.chunk_duration)
+        task = inflight_identifications.get(key)
+        if task is not None:
+            logger.info(f"Reutilizando reconocimiento en curso para URL: {url}")
+        else:
+            manager = app.state.manager
+            
+            # Iniciar el proceso de reconocimiento
+            logger.info(f"Iniciando reconocimiento con {', '.join(request.recognizers)} para URL: {url}")
+            task = asyncio.create_task(manager.identify_tracks(
+                url=url,
+                recognizer_types=request.recognizers,
+                recognizer_params=recognizer_params
+            ))
+            inflight_identifications[key] = task
+            task.add_done_callback(functools.partial(finish_identification, key))
         
-        # Iniciar el proceso de reconocimiento
-        logger.info(f"Iniciando reconocimiento con {', '.join(request.recognizers)} para URL: {request.url}")
-        result = await manager.identify_tracks(
-            url=str(request.url),
-            recognizer_types=request.recognizers,
-            recognizer_params=recognizer_params
-        )
+        # shield: si un cliente se desconecta no se cancela el trabajo de los demás
+        result = await asyncio.shield(task)
         
         # Crear respuesta en el formato esperado por la API
-        tracks = []
-        for track_data in result["combined_results"]:
-            track = Track(
-                timestamp=track_data["timestamp"],
-                title=track_data["title"],
-                artist=track_data["artist"],
-                label=track_data.get("label"),
-                confidence=track_data.get("confidence", 1.0),
-                recognizer=track_data.get("recognizer")
-            )
-            tracks.append(track)
+        tracks = TRACKS_ADAPTER.validate_python([
+            {
+                "timestamp": track_data["timestamp"],
+                "title": track_data["title"],
+                "artist": track_data["artist"],
+                "label": track_data.get("label"),
+                "confidence": track_data.get("confidence", 1.0),
+                "recognizer": track_data.get("recognizer")
+            }
+            for track_data in result["combined_results"]
+        ])
         
-        response = TrackIdentificationResponse(
-            id=result["id"],
-            tracks=tracks,
-            totalTracks=len(tracks)
-        )
+        # Los tracks ya están validados: se devuelve un ORJSONResponse para que FastAPI no vuelva a
+        # validar la respuesta contra el response_model (que se mantiene para la documentación)
+        response = ORJSONResponse(content={
+            "id": result["id"],
+            "tracks": TRACKS_ADAPTER.dump_python(tracks),
+            "totalTracks": len(tracks)
+        })
         
         logger.info(f"Reconocimiento completado: {len(tracks)} tracks identificados")
         return response
         
     except Exception as e:
-        logger.error(f"Error en el reconocimiento: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error en el reconocimiento: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error en el procesamiento: {str(e)}"
         )
 
+def iter_discogs_tracks(items):
+    """
+    Genera un DiscogsTrack por cada resultado de búsqueda de Discogs.
+    Solo se leen los campos que expone la API; el resto del resultado se ignora.
+    Cada resultado se valida por separado: uno mal formado se descarta sin hacer fallar
+    la respuesta completa.
+    """
+    for item in items:
+        try:
+            # Discogs devuelve el título como "Artista - Título"
+            artist, sep, title = item.get("title", "").partition(" - ")
+            if not sep:
+                artist, title = "Unknown", artist
+            
+            yield DiscogsTrack(
+                title=title,
+                artist=artist,
+                year=item.get("year"),
+                country=item.get("country"),
+                format=item.get("format", []),
+                label=item.get("label", []),
+                genre=item.get("genre", []),
+                style=item.get("style", []),
+                resource_url=item.get("resource_url", ""),
+                id=item.get("id", 0)
+            )
+        except Exception as e:
+            logger.error(f"Error procesando resultado de Discogs: {str(e)}")
+            continue
+
+async def fetch_discogs_search(params: dict) -> dict:
+    """Consulta la búsqueda de Discogs, reutilizando respuestas recientes para los mismos parámetros"""
+    cache_key = (
+        f"discogs:search:{params['q']}|{params.get('type', '')}|"
+        f"{params.get('per_page', '')}|{params.get('page', '')}"
+    )
+    data = await cache_get(search_cache, cache_key)
+    if data is not None:
+        logger.info("Búsqueda de Discogs servida desde caché")
+        return data
+    
+    async with http_session.get(DISCOGS_SEARCH_PATH, params=params) as response:
+        logger.info("Respuesta de Discogs - Status Code: %s", response.status)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Headers de respuesta: %s", response.headers)
+        
+        if response.status != 200:
+            error_text = await response.text()
+            logger.error(f"Error en la búsqueda de Discogs: {response.status}")
+            logger.error(f"Respuesta de error: {error_text}")
+            raise HTTPException(
+                status_code=response.status,
+                detail=f"Error en la búsqueda de Discogs: {error_text}"
+            )
+        
+        data = await read_json(response)
+    
+    await cache_set(search_cache, cache_key, data)
+    return data
+
 @app.post("/api/discogs/search", response_model=DiscogsSearchResponse)
 async def search_discogs(request: DiscogsSearchRequest):
     """Busca tracks en Discogs"""
     try:
         logger.info(f"Buscando en Discogs: {request.query}")
         
-        headers = {
-            "User-Agent": DISCOGS_USER_AGENT,
-            "Accept": "application/json",
-            "Authorization": f"Discogs key={DISCOGS_CONSUMER_KEY}, secret={DISCOGS_CONSUMER_SECRET}"
-        }
-        
+        # aiohttp no admite None en la query (requests los omitía): los campos opcionales
+        # enviados como null no se pasan a Discogs
         params = {
-            "q": request.query,
-            "type": request.type,
-            "per_page": request.per_page,
-            "page": request.page
+            key: value
+            for key, value in (
+                ("q", request.query),
+                ("type", request.type),
+                ("per_page", request.per_page),
+                ("page", request.page),
+            )
+            if value is not None
         }
         
-        logger.info(f"Realizando petición a Discogs con headers: {headers}")
-        logger.info(f"Parámetros de búsqueda: {params}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parámetros de búsqueda: %s", params)
         
-        response = requests.get(
-            DISCOGS_API_URL,
-            headers=headers,
-            params=params
-        )
+        data = await fetch_discogs_search(params)
         
-        logger.info(f"Respuesta de Discogs - Status Code: {response.status_code}")
-        logger.info(f"Headers de respuesta: {response.headers}")
-        
-        if response.status_code != 200:
-            logger.error(f"Error en la búsqueda de Discogs: {response.status_code}")
-            logger.error(f"Respuesta de error: {response.text}")
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Error en la búsqueda de Discogs: {response.text}"
-            )
-        
-        data = response.json()
-        
-        tracks = []
-        for item in data.get("results", []):
-            try:
-                title_parts = item.get("title", "").split(" - ", 1)
-                artist = title_parts[0] if len(title_parts) > 1 else "Unknown"
-                title = title_parts[1] if len(title_parts) > 1 else title_parts[0]
-                
-                tracks.append(DiscogsTrack(
-                    title=title,
-                    artist=artist,
-                    year=item.get("year"),
-                    country=item.get("country"),
-                    format=item.get("format", []),
-                    label=item.get("label", []),
-                    genre=item.get("genre", []),
-                    style=item.get("style", []),
-                    resource_url=item.get("resource_url", ""),
-                    id=item.get("id", 0)
-                ))
-            except Exception as e:
-                logger.error(f"Error procesando resultado de Discogs: {str(e)}")
-                continue
+        tracks = list(iter_discogs_tracks(data.get("results") or ()))
         
         logger.info(f"Búsqueda completada. {len(tracks)} resultados encontrados")
         
@@ -412,67 +603,111 @@ async def search_discogs(request: DiscogsSearchRequest):
         )
         
     except Exception as e:
-        logger.error(f"Error en la búsqueda de Discogs: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error en la búsqueda de Discogs: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error en la búsqueda de Discogs: {str(e)}"
         )
 
-@app.get("/api/discogs/releases/{release_id}", response_model=DiscogsReleaseResponse)
+async def fetch_discogs_release(release_id: int, curr_abbr: Optional[str]) -> dict:
+    """Obtiene un release de Discogs, reutilizando la respuesta si ya se pidió hace poco"""
+    cache_key = f"discogs:release:{release_id}:{curr_abbr or ''}"
+    data = await cache_get(release_cache, cache_key)
+    if data is not None:
+        logger.info(f"Release {release_id} servido desde caché")
+        return data
+    
+    # Igual que en la búsqueda, los parámetros sin valor no se pasan a aiohttp
+    params = {key: value for key, value in (("curr_abbr", curr_abbr),) if value}
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Parámetros: %s", params)
+    
+    async with http_session.get(
+        f"{DISCOGS_RELEASE_PATH}/{release_id}",
+        params=params
+    ) as response:
+        logger.info("Respuesta de Discogs - Status Code: %s", response.status)
+        
+        if response.status != 200:
+            error_text = await response.text()
+            logger.error(f"Error al obtener el release: {response.status}")
+            logger.error(f"Respuesta de error: {error_text}")
+            raise HTTPException(
+                status_code=response.status,
+                detail=f"Error al obtener el release: {error_text}"
+            )
+        
+        data = await read_json(response)
+    
+    await cache_set(release_cache, cache_key, data)
+    return data
+
+@app.get(
+    "/api/discogs/releases/{release_id}",
+    response_model=None,
+    responses={200: {"model": DiscogsReleaseResponse}}
+)
 async def get_discogs_release(release_id: int, curr_abbr: Optional[str] = None):
     """Obtiene información detallada de un release de Discogs"""
     try:
         logger.info(f"Obteniendo información del release {release_id}")
         
-        headers = {
-            "User-Agent": DISCOGS_USER_AGENT,
-            "Accept": "application/json",
-            "Authorization": f"Discogs key={DISCOGS_CONSUMER_KEY}, secret={DISCOGS_CONSUMER_SECRET}"
-        }
-        
-        params = {}
-        if curr_abbr:
-            params["curr_abbr"] = curr_abbr
-        
-        logger.info(f"Realizando petición a Discogs con headers: {headers}")
-        logger.info(f"Parámetros: {params}")
-        
-        response = requests.get(
-            f"{DISCOGS_RELEASE_URL}/{release_id}",
-            headers=headers,
-            params=params
-        )
-        
-        logger.info(f"Respuesta de Discogs - Status Code: {response.status_code}")
-        
-        if response.status_code != 200:
-            logger.error(f"Error al obtener el release: {response.status_code}")
-            logger.error(f"Respuesta de error: {response.text}")
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Error al obtener el release: {response.text}"
-            )
-        
-        data = response.json()
+        data = await fetch_discogs_release(release_id, curr_abbr)
         logger.info(f"Release obtenido correctamente: {data.get('title')}")
         
-        return data
+        if DISCOGS_VALIDATE_RELEASES:
+            return ORJSONResponse(content=RELEASE_ADAPTER.validate_python(data).model_dump())
+        return ORJSONResponse(content=data)
         
     except Exception as e:
-        logger.error(f"Error al obtener el release: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error al obtener el release: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error al obtener el release: {str(e)}"
         )
 
+@app.get("/api/discogs/releases/{release_id}/tracklist", response_model=List[DiscogsReleaseTrack])
+async def get_discogs_release_tracklist(release_id: int):
+    """Devuelve solo el tracklist de un release de Discogs"""
+    try:
+        data = await fetch_discogs_release(release_id, None)
+        return data.get("tracklist") or []
+    except Exception as e:
+        logger.exception(f"Error al obtener el tracklist del release: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al obtener el tracklist del release: {str(e)}"
+        )
+
+@app.get("/api/discogs/releases/{release_id}/images", response_model=List[DiscogsImage])
+async def get_discogs_release_images(release_id: int):
+    """Devuelve solo las imágenes de un release de Discogs"""
+    try:
+        data = await fetch_discogs_release(release_id, None)
+        return data.get("images") or []
+    except Exception as e:
+        logger.exception(f"Error al obtener las imágenes del release: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al obtener las imágenes del release: {str(e)}"
+        )
+
 def format_time(seconds):
-    """Formatea segundos a formato MM:SS"""
-    minutes = seconds // 60
-    seconds = seconds % 60
+    """Formatea segundos (int o float) a formato MM:SS"""
+    minutes, seconds = divmod(int(seconds), 60)
     return f"{minutes:02d}:{seconds:02d}"
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # loop/http "auto" usan uvloop y httptools si están instalados.
+    # WEB_CONCURRENCY define el número de workers; el access log se activa con ACCESS_LOG=1.
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        loop="auto",
+        http="auto",
+        access_log=os.getenv("ACCESS_LOG") == "1"
+    )
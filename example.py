@@ -140,6 +140,7 @@ async def main():
         if "track_finder" in recognizer_types:
             recognizer_params["track_finder"]["executable_path"] = args.executable_path
     
+    manager = None
     try:
         # Crear el gestor de reconocimiento
         manager = TrackRecognitionManager(output_dir=args.output_dir)
@@ -181,6 +182,10 @@ async def main():
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        # Cerrar las sesiones HTTP compartidas de los reconocedores (Shazam, AcoustID)
+        if manager is not None:
+            await manager.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -6,13 +6,24 @@ tracks de audio utilizando diferentes servicios como Shazam, AcoustID y otros
 reconocedores personalizados.
 """
 
+import importlib
+
 from recognizers.base_recognizer import BaseRecognizer
-from recognizers.shazam_recognizer import ShazamRecognizer
-from recognizers.acoustid_recognizer import AcoustIDRecognizer
-from recognizers.executable_recognizer import ExecutableRecognizer
 from recognizers.factory import RecognizerFactory
 from recognizers.manager import TrackRecognitionManager
 
+# Los reconocedores concretos se importan solo al acceder a ellos (ver RecognizerFactory)
+_LAZY_RECOGNIZERS = {
+    'ShazamRecognizer': 'recognizers.shazam_recognizer',
+    'AcoustIDRecognizer': 'recognizers.acoustid_recognizer',
+    'ExecutableRecognizer': 'recognizers.executable_recognizer',
+}
+
+def __getattr__(name):
+    if name in _LAZY_RECOGNIZERS:
+        return getattr(importlib.import_module(_LAZY_RECOGNIZERS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 __all__ = [
     'BaseRecognizer',
     'ShazamRecognizer',
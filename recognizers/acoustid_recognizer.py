@@ -1,26 +1,59 @@
 import asyncio
-import subprocess
+import hashlib
 import json
 import logging
-import requests
+import traceback
+import os
+import aiohttp
+from pathlib import Path
 from typing import List, Dict, Any, Tuple, Optional
 
 from recognizers.base_recognizer import BaseRecognizer
-from recognizers.utils import download_audio, split_audio, are_tracks_similar
+from recognizers.utils import download_audio, split_audio, track_signature, are_signatures_similar, file_digest, RateLimiter, ResultCache
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
 logger = logging.getLogger(__name__)
 
+ACOUSTID_LOOKUP_URL = "https://api.acoustid.org/v2/lookup"
+# AcoustID permite 3 peticiones por segundo por cliente
+ACOUSTID_REQUESTS_PER_SECOND = 3
+# Huellas ya calculadas, guardadas por hash del contenido del chunk
+FINGERPRINT_CACHE_DIR = ".fpcache"
+# Huellas que se mantienen además en memoria
+FINGERPRINT_MEMO_SIZE = 1024
+
+def parse_fpcalc_json(output: bytes) -> List[Tuple[int, str]]:
+    """
+    Interpreta la salida de `fpcalc -json` con uno o varios archivos: fpcalc imprime un objeto
+    JSON por línea, en el mismo orden que los argumentos y sin el nombre del archivo.
+    
+    Args:
+        output: Salida estándar de fpcalc
+        
+    Returns:
+        Lista de (duración, huella_digital), una por cada objeto válido de la salida
+    """
+    fingerprints = []
+    for line in output.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            fingerprints.append((data['duration'], data['fingerprint']))
+        except (ValueError, KeyError, TypeError):
+            continue
+    return fingerprints
+
 class AcoustIDRecognizer(BaseRecognizer):
     """
     Reconocedor de tracks utilizando AcoustID.
     """
     
+    # fpcalc es CPU-bound: se calculan tantas huellas a la vez como núcleos haya
+    max_concurrent_chunks = os.cpu_count() or 4
+    # Cada lote de prepare_chunks reparte unos 4 chunks por proceso de fpcalc
+    prepare_batch_size = 4 * max_concurrent_chunks
+    
     def __init__(self, client_api_key: str = "YjBc2sAt2S", chunk_duration: int = 60):
         """
         Inicializa el reconocedor de AcoustID.
@@ -31,6 +64,36 @@ class AcoustIDRecognizer(BaseRecognizer):
         """
         super().__init__(chunk_duration)
         self.client_api_key = client_api_key
+        # Sesión HTTP reutilizada por todas las consultas (se crea dentro del bucle de eventos)
+        self._http: Optional[aiohttp.ClientSession] = None
+        # Las huellas se calculan en paralelo; las consultas se reparten los tokens del límite de AcoustID
+        self._rate_limiter = RateLimiter(ACOUSTID_REQUESTS_PER_SECOND)
+        self._fp_cache = ResultCache(FINGERPRINT_CACHE_DIR, FINGERPRINT_MEMO_SIZE)
+    
+    def _get_http(self) -> aiohttp.ClientSession:
+        """
+        Devuelve la sesión HTTP del reconocedor, creándola en el primer uso.
+        """
+        if self._http is None or self._http.closed:
+            # El token bucket no deja pasar más de ACOUSTID_REQUESTS_PER_SECOND consultas por
+            # segundo, así que bastan esas conexiones; se mantienen abiertas para reutilizarlas
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=ACOUSTID_REQUESTS_PER_SECOND,
+                    keepalive_timeout=60,
+                    ttl_dns_cache=300,
+                ),
+                timeout=aiohttp.ClientTimeout(total=30),
+            )
+        return self._http
+    
+    async def aclose(self) -> None:
+        """
+        Cierra la sesión HTTP del reconocedor si está abierta.
+        """
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
     
     async def download_audio(self, url: str) -> Tuple[str, str]:
         """
@@ -42,49 +105,186 @@ class AcoustIDRecognizer(BaseRecognizer):
         Returns:
             Tuple con (ruta_archivo, título_video)
         """
-        return download_audio(url)
+        # yt-dlp y ffmpeg bloquean, se ejecutan en un hilo para no frenar el bucle de eventos
+        return await asyncio.to_thread(download_audio, url)
     
-    def split_audio(self, audio_path: str) -> Tuple[List[str], int]:
+    def split_audio(self, audio_path: str, output_dir: str = ".") -> Tuple[List[str], int]:
         """
         Divide el archivo de audio en fragmentos para su análisis.
         
         Args:
             audio_path: Ruta al archivo de audio a dividir
+            output_dir: Directorio donde se escriben los fragmentos
             
         Returns:
             Tuple con (lista_de_chunks, duración_total_en_segundos)
         """
-        return split_audio(audio_path, self.chunk_duration)
+        return split_audio(audio_path, self.chunk_duration, output_dir)
+    
+    def _read_fingerprint_cache(self, key: str) -> Optional[Tuple[int, str]]:
+        """
+        Busca la huella en la caché (memoria y después disco).
+        
+        Args:
+            key: Hash BLAKE2b del contenido del chunk
+            
+        Returns:
+            Tuple con (duración, huella_digital) o None si no está cacheada
+        """
+        cached = self._fp_cache.get(key)
+        return (cached["duration"], cached["fingerprint"]) if cached else None
+    
+    def _write_fingerprint_cache(self, key: str, value: Tuple[int, str]) -> None:
+        """
+        Guarda la huella en memoria y en la caché de disco.
+        """
+        self._fp_cache.set(key, {"duration": value[0], "fingerprint": value[1]})
+    
+    def _uncached_chunks(self, chunks: List[str], digests: Optional[List[bytes]] = None) -> Dict[str, str]:
+        """
+        Devuelve los chunks cuya huella aún no está en caché, con su clave de caché.
+        
+        Args:
+            chunks: Lista de rutas a los chunks
+            digests: Hash del contenido de cada chunk; solo se calcula aquí si no se proporciona
+            
+        Returns:
+            Diccionario {ruta_chunk: hash_del_contenido}
+        """
+        if digests is None:
+            digests = [file_digest(chunk) for chunk in chunks]
+        pending = {}
+        for chunk, digest in zip(chunks, digests):
+            key = digest.hex()
+            if self._read_fingerprint_cache(key) is None:
+                pending[chunk] = key
+        return pending
     
-    def generate_fingerprint(self, audio_path: str) -> Tuple[int, str]:
+    async def _run_fpcalc(self, chunks: List[str]) -> List[Tuple[int, str]]:
+        """
+        Ejecuta `fpcalc -json` sobre uno o varios chunks.
+        
+        Args:
+            chunks: Lista de rutas a los chunks
+            
+        Returns:
+            Lista de (duración, huella_digital) en el orden de los argumentos; si algún chunk
+            falló, la lista tiene menos elementos que chunks
+        """
+        proc = await asyncio.create_subprocess_exec(
+            'fpcalc', '-json', *chunks,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        out, err = await proc.communicate()
+        if proc.returncode != 0:
+            logger.warning(f"fpcalc no pudo procesar todo el lote: {err.decode(errors='replace')}")
+        return parse_fpcalc_json(out)
+    
+    async def _fpcalc_batch(self, chunks: List[str]) -> Dict[str, Tuple[int, str]]:
+        """
+        Calcula las huellas de varios chunks con una sola ejecución de fpcalc. Las huellas se
+        asocian a cada chunk por el orden de los argumentos; si el número de resultados no
+        coincide (algún chunk ilegible) no se puede saber cuál falló y el lote se repite chunk a chunk.
+        
+        Args:
+            chunks: Lista de rutas a los chunks
+            
+        Returns:
+            Diccionario {ruta_chunk: (duración, huella_digital)} con los chunks que fpcalc pudo procesar
+        """
+        fingerprints = await self._run_fpcalc(chunks)
+        if len(fingerprints) == len(chunks):
+            return dict(zip(chunks, fingerprints))
+        
+        logger.warning(
+            f"fpcalc devolvió {len(fingerprints)} huellas para {len(chunks)} chunks; se calculan por separado"
+        )
+        singles = await asyncio.gather(*(self._run_fpcalc([chunk]) for chunk in chunks))
+        return {chunk: result[0] for chunk, result in zip(chunks, singles) if len(result) == 1}
+    
+    async def prepare_chunks(self, chunks: List[str], digests: Optional[List[bytes]] = None) -> None:
+        """
+        Calcula por adelantado las huellas de un lote de chunks repartiéndolo en tantos procesos de
+        fpcalc como chunks simultáneos admite el reconocedor, en lugar de lanzar un proceso por chunk.
+        Las huellas quedan en la caché, de donde las toma generate_fingerprint.
+        
+        Args:
+            chunks: Lista de rutas a los chunks que se van a reconocer
+            digests: Hash del contenido de cada chunk, en el mismo orden (si ya se calcularon)
+        """
+        pending = await asyncio.to_thread(self._uncached_chunks, chunks, digests)
+        if not pending:
+            return
+        
+        paths = list(pending)
+        batch_count = min(self.max_concurrent_chunks, len(paths))
+        batches = [paths[i::batch_count] for i in range(batch_count)]
+        logger.info(f"Generando {len(paths)} huellas digitales en {batch_count} lotes de fpcalc")
+        try:
+            results = await asyncio.gather(*(self._fpcalc_batch(batch) for batch in batches))
+        except Exception as e:
+            # Si falla, cada chunk calculará su huella por separado en recognize_chunk
+            logger.warning(f"Error generando huellas por lotes: {str(e)}")
+            return
+        
+        for fingerprints in results:
+            for chunk, fingerprint in fingerprints.items():
+                if chunk in pending:
+                    await asyncio.to_thread(self._write_fingerprint_cache, pending[chunk], fingerprint)
+    
+    async def generate_fingerprint(self, audio_path: str, digest: Optional[bytes] = None) -> Tuple[int, str]:
         """
         Genera la huella digital de un archivo de audio utilizando fpcalc.
+        Las huellas se cachean por hash del contenido, así que repetir un chunk ya visto no ejecuta fpcalc.
         
         Args:
             audio_path: Ruta al archivo de audio a analizar
+            digest: Hash del contenido del archivo si ya se calculó (file_digest)
             
         Returns:
             Tuple con (duración, huella_digital)
         """
         logger.info(f"Generando huella digital para {audio_path}")
         try:
-            result = subprocess.run(
-                ['fpcalc', '-json', audio_path],
-                capture_output=True,
-                text=True,
-                check=True
-            )
+            # El chunk se lee entero en una sola llamada (en un hilo) y se pasa a fpcalc por stdin;
+            # si el hash ya viene calculado solo se lee cuando no está en caché
+            audio_bytes = None
+            if digest is None:
+                audio_bytes = await asyncio.to_thread(Path(audio_path).read_bytes)
+                digest = hashlib.blake2b(audio_bytes, digest_size=16).digest()
+            key = digest.hex()
+            cached = await asyncio.to_thread(self._read_fingerprint_cache, key)
+            if cached is not None:
+                logger.info(f"Huella digital recuperada de la caché")
+                return cached
+            if audio_bytes is None:
+                audio_bytes = await asyncio.to_thread(Path(audio_path).read_bytes)
             
-            data = json.loads(result.stdout)
-            logger.info(f"Huella digital generada exitosamente")
-            return data['duration'], data['fingerprint']
+            proc = await asyncio.create_subprocess_exec(
+                'fpcalc', '-json', '-',
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            out, err = await proc.communicate(audio_bytes)
+        except Exception as e:
+            raise Exception(f"Error procesando archivo: {str(e)}")
+        
+        if proc.returncode != 0:
+            raise Exception(f"Error en fpcalc: {err.decode(errors='replace')}")
         
-        except subprocess.CalledProcessError as e:
-            raise Exception(f"Error en fpcalc: {e.stderr}")
+        try:
+            data = json.loads(out)
+            fingerprint = (data['duration'], data['fingerprint'])
         except Exception as e:
             raise Exception(f"Error procesando archivo: {str(e)}")
+        
+        logger.info(f"Huella digital generada exitosamente")
+        await asyncio.to_thread(self._write_fingerprint_cache, key, fingerprint)
+        return fingerprint
     
-    def acoustid_lookup(self, fingerprint: str, duration: int) -> Dict[str, Any]:
+    async def acoustid_lookup(self, fingerprint: str, duration: int) -> Dict[str, Any]:
         """
         Consulta la API de AcoustID con la huella digital generada.
         
@@ -104,19 +304,15 @@ class AcoustIDRecognizer(BaseRecognizer):
         logger.info(f"Consultando datos en AcoustID...")
         
         try:
-            response = requests.get(
-                "https://api.acoustid.org/v2/lookup",
-                params=params
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"Datos recibidos de AcoustID")
-                return response.json()
-            else:
-                logger.error(f"Error obteniendo datos de AcoustID: {response.status_code}")
-                logger.debug(f"Respuesta: {response.text}")
-                return {"status": "error", "error": f"HTTP {response.status_code}"}
-        except requests.exceptions.RequestException as e:
+            async with self._get_http().get(ACOUSTID_LOOKUP_URL, params=params) as response:
+                if response.status == 200:
+                    logger.info(f"Datos recibidos de AcoustID")
+                    return await response.json(content_type=None)
+                else:
+                    logger.error(f"Error obteniendo datos de AcoustID: {response.status}")
+                    logger.debug(f"Respuesta: {await response.text()}")
+                    return {"status": "error", "error": f"HTTP {response.status}"}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             raise Exception(f"Error en la petición HTTP: {str(e)}")
     
     def process_acoustid_results(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -131,11 +327,20 @@ class AcoustIDRecognizer(BaseRecognizer):
         """
         logger.info(f"Procesando resultados de AcoustID")
         
-        if data.get("status") != "ok" or not data.get("results"):
+        if data.get("status") != "ok":
             return None
         
-        # Obtener el resultado con mayor score
-        best_result = max(data["results"], key=lambda x: x.get("score", 0))
+        # Obtener el resultado con mayor score en una sola pasada
+        best_result = None
+        best_score = -1.0
+        for candidate in data.get("results") or ():
+            score = candidate.get("score") or 0.0
+            if score > best_score:
+                best_score = score
+                best_result = candidate
+        
+        if best_result is None:
+            return None
         
         if not best_result.get("recordings"):
             return {
@@ -150,7 +355,7 @@ class AcoustIDRecognizer(BaseRecognizer):
         recording = best_result["recordings"][0]
         
         # Extraer artistas si están disponibles
-        artists = [artist["name"] for artist in recording.get("artists", [])]
+        artists = [artist["name"] for artist in recording.get("artists") or ()]
         artist_string = ", ".join(artists) if artists else "Unknown Artist"
         
         return {
@@ -161,26 +366,24 @@ class AcoustIDRecognizer(BaseRecognizer):
             "recognizer": "acoustid"
         }
     
-    async def recognize_chunk(self, chunk_path: str) -> Optional[Dict[str, Any]]:
+    async def recognize_chunk(self, chunk_path: str, digest: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
         """
         Reconoce un fragmento de audio utilizando AcoustID.
         
         Args:
             chunk_path: Ruta al archivo de chunk a reconocer
+            digest: Hash del contenido del chunk si ya se calculó
             
         Returns:
             Diccionario con los datos del reconocimiento o None si no se reconoció
         """
         try:
             # Generar huella digital
-            duration, fingerprint = self.generate_fingerprint(chunk_path)
-            
-            # Esperar antes de hacer la petición para no sobrecargar la API
-            logger.info("Esperando 4 segundos antes de consultar AcoustID...")
-            await asyncio.sleep(4)
+            duration, fingerprint = await self.generate_fingerprint(chunk_path, digest)
             
-            # Consultar AcoustID
-            result = self.acoustid_lookup(fingerprint, duration)
+            # Consultar AcoustID (el token bucket espacia las peticiones de todos los chunks)
+            async with self._rate_limiter:
+                result = await self.acoustid_lookup(fingerprint, duration)
             
             # Procesar resultados
             processed_result = self.process_acoustid_results(result)
@@ -193,7 +396,6 @@ class AcoustIDRecognizer(BaseRecognizer):
             return processed_result
         except Exception as e:
             logger.error(f"Error en el reconocimiento con AcoustID: {str(e)}")
-            import traceback
             logger.error(traceback.format_exc())
             return None
     
@@ -209,6 +411,7 @@ class AcoustIDRecognizer(BaseRecognizer):
         """
         logger.info("Procesando resultados de AcoustID")
         raw_tracks = []
+        signatures = []
         
         # Extraer información básica de cada resultado
         for i, result in enumerate(results):
@@ -227,18 +430,24 @@ class AcoustIDRecognizer(BaseRecognizer):
                     "recognizer": "acoustid"
                 }
                 raw_tracks.append(track)
+                # La firma normalizada se calcula una sola vez por track
+                signatures.append(track_signature(track))
         
-        # Consolidar tracks (eliminar duplicados consecutivos)
+        # Consolidar tracks (eliminar duplicados consecutivos). En una mezcla larga casi todos
+        # los chunks repiten el track anterior: si la firma es idéntica no hace falta la
+        # comparación difusa
         consolidated_tracks = []
         current_track = None
+        current_signature = None
         
-        for track in raw_tracks:
+        for track, signature in zip(raw_tracks, signatures):
             if not current_track:
                 current_track = track
+                current_signature = signature
                 continue
             
             # Si el track actual es similar al anterior, lo ignoramos
-            if are_tracks_similar(current_track, track):
+            if are_signatures_similar(current_signature, signature):
                 # Actualizar la confianza si la nueva es mayor
                 if track["confidence"] > current_track["confidence"]:
                     current_track["confidence"] = track["confidence"]
@@ -247,20 +456,11 @@ class AcoustIDRecognizer(BaseRecognizer):
                 # Si es diferente, guardamos el anterior y actualizamos el actual
                 consolidated_tracks.append(current_track)
                 current_track = track
+                current_signature = signature
         
         # Agregar el último track si existe
         if current_track:
             consolidated_tracks.append(current_track)
         
-        # Formatear los timestamps como strings (MM:SS o HH:MM:SS)
-        for track in consolidated_tracks:
-            seconds = track["timestamp"]
-            mins, secs = divmod(seconds, 60)
-            hours, mins = divmod(mins, 60)
-            if hours > 0:
-                track["timestamp"] = f"{hours:02d}:{mins:02d}:{secs:02d}"
-            else:
-                track["timestamp"] = f"{mins:02d}:{secs:02d}"
-        
         logger.info(f"Se procesaron {len(consolidated_tracks)} tracks únicos")
         return consolidated_tracks 
\ No newline at end of file
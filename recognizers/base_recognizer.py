@@ -1,15 +1,13 @@
 import os
 import asyncio
 import logging
+import traceback
+import tempfile
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator
+
+from recognizers.utils import file_digest, iter_split_audio, format_time, tmp_root
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
 logger = logging.getLogger(__name__)
 
 class BaseRecognizer(ABC):
@@ -18,15 +16,23 @@ class BaseRecognizer(ABC):
     Define la interfaz común que todos los reconocedores deben implementar.
     """
     
-    def __init__(self, chunk_duration: int = 30):
+    # Chunks que se reconocen a la vez; por defecto uno tras otro
+    max_concurrent_chunks = 1
+    # Chunks que se acumulan antes de pasarlos juntos a prepare_chunks
+    prepare_batch_size = 1
+    
+    def __init__(self, chunk_duration: int = 30, max_concurrent_chunks: Optional[int] = None):
         """
         Inicializa el reconocedor con la duración de chunk predeterminada.
         
         Args:
             chunk_duration: Duración en segundos de cada fragmento de audio a analizar
+            max_concurrent_chunks: Chunks reconocidos a la vez (por defecto el valor de la clase)
         """
         self.chunk_duration = chunk_duration
         self.name = self.__class__.__name__
+        if max_concurrent_chunks is not None:
+            self.max_concurrent_chunks = max(1, max_concurrent_chunks)
     
     @abstractmethod
     async def download_audio(self, url: str) -> Tuple[str, str]:
@@ -42,12 +48,13 @@ class BaseRecognizer(ABC):
         pass
     
     @abstractmethod
-    def split_audio(self, audio_path: str) -> Tuple[List[str], int]:
+    def split_audio(self, audio_path: str, output_dir: str = ".") -> Tuple[List[str], int]:
         """
         Divide el archivo de audio en fragmentos para su análisis.
         
         Args:
             audio_path: Ruta al archivo de audio a dividir
+            output_dir: Directorio donde se escriben los fragmentos
             
         Returns:
             Tuple con (lista_de_chunks, duración_total_en_segundos)
@@ -55,18 +62,44 @@ class BaseRecognizer(ABC):
         pass
     
     @abstractmethod
-    async def recognize_chunk(self, chunk_path: str) -> Optional[Dict[str, Any]]:
+    async def recognize_chunk(self, chunk_path: str, digest: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
         """
         Reconoce un fragmento de audio utilizando el servicio correspondiente.
         
         Args:
             chunk_path: Ruta al archivo de chunk a reconocer
+            digest: Hash del contenido del chunk (file_digest) si ya se calculó; si es None
+                el reconocedor lo calcula cuando lo necesite
             
         Returns:
             Diccionario con los datos del reconocimiento o None si no se reconoció
         """
         pass
     
+    def iter_chunks(self, audio_path: str, output_dir: str) -> AsyncIterator[str]:
+        """
+        Genera los fragmentos del audio a medida que se escriben.
+        
+        Args:
+            audio_path: Ruta al archivo de audio a dividir
+            output_dir: Directorio donde se escriben los fragmentos
+            
+        Returns:
+            Iterador asíncrono con la ruta de cada fragmento, en orden
+        """
+        return iter_split_audio(audio_path, self.chunk_duration, output_dir)
+    
+    async def prepare_chunks(self, chunks: List[str], digests: Optional[List[bytes]] = None) -> None:
+        """
+        Punto de extensión que se ejecuta con cada lote de prepare_batch_size chunks antes de
+        reconocerlos, para que un reconocedor pueda procesarlos juntos. Por defecto no hace nada.
+        
+        Args:
+            chunks: Lista de rutas a los chunks (sin duplicados) que se van a reconocer
+            digests: Hash del contenido de cada chunk, en el mismo orden (si ya se calcularon)
+        """
+        pass
+    
     @abstractmethod
     def process_results(self, results: List[Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
         """
@@ -76,29 +109,110 @@ class BaseRecognizer(ABC):
             results: Lista de resultados de reconocimiento
             
         Returns:
-            Lista de tracks identificados con su información
+            Lista de tracks identificados con su información, con "timestamp" en segundos
+            (se formatea una sola vez al devolver el tracklist)
         """
         pass
     
-    def cleanup(self, audio_path: str, chunks: List[str]) -> None:
+    async def cleanup(self, audio_path: str, chunks: List[str]) -> None:
         """
-        Limpia los archivos temporales creados durante el proceso.
+        Limpia los archivos temporales creados durante el proceso. Los borrados se
+        lanzan a la vez en hilos para no bloquear el bucle de eventos.
         
         Args:
             audio_path: Ruta al archivo de audio original
             chunks: Lista de rutas a los fragmentos de audio
         """
+        paths = [audio_path, *chunks]
+        outcomes = await asyncio.gather(
+            *(asyncio.to_thread(os.remove, path) for path in paths),
+            return_exceptions=True
+        )
+        removed = 0
+        for path, outcome in zip(paths, outcomes):
+            if outcome is None:
+                removed += 1
+            elif not isinstance(outcome, FileNotFoundError):
+                logger.error(f"Error during cleanup of {path}: {str(outcome)}")
+        logger.info(f"Removed {removed} temporary files")
+    
+    async def identify_tracks_in_file(self, audio_path: str, format_timestamps: bool = True) -> List[Dict[str, Any]]:
+        """
+        Identifica los tracks de un archivo de audio ya descargado.
+        Los chunks se escriben en un directorio temporal propio de esta llamada, de modo que
+        varios reconocedores pueden analizar el mismo archivo a la vez. El archivo de audio no se borra.
+        
+        Args:
+            audio_path: Ruta al archivo de audio a analizar
+            format_timestamps: Si es False los timestamps se dejan en segundos (para quien
+                combine tracklists y los formatee al final)
+            
+        Returns:
+            Lista de tracks identificados con su información
+        """
+        # El directorio de chunks se borra en un hilo: con cientos de chunks el rmtree
+        # bloquearía el bucle de eventos
+        chunks_tmp = tempfile.TemporaryDirectory(prefix=f"{self.name}_", dir=tmp_root())
+        chunks_dir = chunks_tmp.name
         try:
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
-                logger.info(f"Removed audio file: {audio_path}")
-            
-            for chunk in chunks:
-                if os.path.exists(chunk):
-                    os.remove(chunk)
-            logger.info(f"Removed {len(chunks)} chunk files")
-        except Exception as e:
-            logger.error(f"Error during cleanup: {str(e)}")
+            # Reconocer los chunks, como mucho max_concurrent_chunks a la vez
+            semaphore = asyncio.Semaphore(self.max_concurrent_chunks)
+            
+            async def recognize(chunk: str, digest: bytes) -> Optional[Dict[str, Any]]:
+                async with semaphore:
+                    return await self.recognize_chunk(chunk, digest)
+            
+            # Productor/consumidor: cada chunk se empieza a reconocer en cuanto ffmpeg lo cierra,
+            # mientras se siguen escribiendo los siguientes. Los chunks con contenido idéntico
+            # (silencios, intros repetidas) se reconocen una sola vez.
+            digests: List[bytes] = []
+            seen = set()
+            tasks_by_digest: Dict[bytes, asyncio.Task] = {}
+            pending: List[Tuple[bytes, str]] = []
+            
+            async def flush() -> None:
+                if not pending:
+                    return
+                # El hash ya calculado para deduplicar se pasa a los reconocedores, que lo usan
+                # como clave de caché sin volver a leer el chunk
+                await self.prepare_chunks(
+                    [chunk for _, chunk in pending], [digest for digest, _ in pending]
+                )
+                for digest, chunk in pending:
+                    tasks_by_digest[digest] = asyncio.create_task(recognize(chunk, digest))
+                pending.clear()
+            
+            try:
+                async for chunk in self.iter_chunks(audio_path, chunks_dir):
+                    digest = await asyncio.to_thread(file_digest, chunk)
+                    digests.append(digest)
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                    pending.append((digest, chunk))
+                    if len(pending) >= self.prepare_batch_size:
+                        await flush()
+                await flush()
+                
+                logger.info(f"Audio split into {len(digests)} chunks ({len(tasks_by_digest)} unique)")
+                unique_results = await asyncio.gather(*tasks_by_digest.values())
+            except BaseException:
+                for task in tasks_by_digest.values():
+                    task.cancel()
+                raise
+            
+            results_by_digest = dict(zip(tasks_by_digest, unique_results))
+            results = [results_by_digest[digest] for digest in digests]
+            
+            # Procesar resultados
+            tracks = self.process_results(results)
+            if format_timestamps:
+                for track in tracks:
+                    if not isinstance(track["timestamp"], str):
+                        track["timestamp"] = format_time(track["timestamp"])
+            return tracks
+        finally:
+            await asyncio.to_thread(chunks_tmp.cleanup)
     
     async def identify_tracks(self, url: str) -> List[Dict[str, Any]]:
         """
@@ -117,26 +231,13 @@ class BaseRecognizer(ABC):
             audio_path, video_title = await self.download_audio(url)
             logger.info(f"Audio downloaded: {audio_path}")
             
-            # Dividir en chunks
-            chunks, total_duration = self.split_audio(audio_path)
-            logger.info(f"Audio split into {len(chunks)} chunks")
-            
-            # Reconocer cada chunk
-            results = []
-            for chunk in chunks:
-                result = await self.recognize_chunk(chunk)
-                results.append(result)
-                
-            # Procesar resultados
-            tracklist = self.process_results(results)
-            
-            # Limpiar archivos temporales
-            self.cleanup(audio_path, chunks)
-            
-            return tracklist
+            try:
+                return await self.identify_tracks_in_file(audio_path)
+            finally:
+                # Limpiar el archivo descargado (los chunks se borran con su directorio temporal)
+                await self.cleanup(audio_path, [])
             
         except Exception as e:
             logger.error(f"Error in {self.name} track identification: {str(e)}")
-            import traceback
             logger.error(traceback.format_exc())
             return [] 
\ No newline at end of file
@@ -1,73 +1,156 @@
 import asyncio
+import collections
+import contextvars
 import subprocess
-import json
 import logging
+import traceback
 import os
+import shutil
+import functools
+import hashlib
+import orjson
 import tempfile
-from typing import List, Dict, Any, Tuple, Optional
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator
 
 from recognizers.base_recognizer import BaseRecognizer
-from recognizers.utils import download_audio, split_audio, are_tracks_similar
-from pydub import AudioSegment
+from recognizers.utils import download_audio, split_audio, iter_split_audio, track_signature, are_signatures_similar, file_digest, wav_rms, wav_band_profile, ResultCache
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
 logger = logging.getLogger(__name__)
 
+# Resultados del ejecutable por hash del contenido del chunk, reutilizados entre ejecuciones.
+# Cada binario (ruta, tamaño y fecha de modificación) tiene su propio subdirectorio, así que
+# actualizar track_finder o su base de datos empieza una caché nueva
+RESULT_CACHE_DIR = ".track_finder_cache"
+RESULT_MEMO_SIZE = 1024
+
+# Por debajo de esta energía RMS (muestras de 16 bits) el chunk se considera silencio y no
+# se lanza el ejecutable
+SILENCE_RMS_THRESHOLD = 100
+
+# Matches recientes contra los que se compara la huella perceptual de cada chunk nuevo
+PERCEPTUAL_CACHE_SIZE = 16
+
+# Cola de matches recientes del archivo que se está analizando. Cada llamada a
+# identify_tracks_in_file fija la suya y las tareas de sus chunks la heredan con el contexto,
+# así que un match nunca se reutiliza en otro archivo ni en otra petición simultánea
+_perceptual_matches: contextvars.ContextVar[Optional[collections.deque]] = contextvars.ContextVar(
+    "perceptual_matches", default=None
+)
+
+# Argumentos de ffmpeg para cada formato de chunk: track_finder.exe lee WAV, así que por
+# defecto los segmentos se escriben directamente en PCM y no hace falta convertirlos después
+CHUNK_CODEC_ARGS = {
+    "wav": ("-c:a", "pcm_s16le"),
+    "mp3": ("-c", "copy"),
+}
+
+@dataclass(slots=True)
+class _TrackGroup:
+    """Chunks consecutivos reconocidos como el mismo track, antes de pasarlos a dict"""
+    title: str
+    artist: str
+    start: int
+    confidence: float
+    signature: Tuple[str, str]
+
+@functools.lru_cache(maxsize=None)
+def _resolve_executable(executable_path: str) -> Optional[str]:
+    """
+    Busca el ejecutable en la ruta indicada y, si no está, en las rutas habituales y en el PATH.
+    Se cachea por ruta para que crear varios reconocedores no repita las comprobaciones.
+    
+    Args:
+        executable_path: Ruta configurada del ejecutable
+        
+    Returns:
+        Ruta donde se encontró el ejecutable o None si no existe
+    """
+    basename = os.path.basename(executable_path)
+    candidates = (
+        executable_path,
+        os.path.join(os.getcwd(), "recognizers", basename),
+        os.path.join(os.getcwd(), basename),
+    )
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return shutil.which(basename)
+
+def _executable_identity(path: str) -> str:
+    """
+    Identifica una versión concreta del ejecutable para separar sus resultados en la caché.
+    
+    Args:
+        path: Ruta donde se encontró el ejecutable
+        
+    Returns:
+        Hash hexadecimal de la ruta resuelta, el tamaño y la fecha de modificación
+    """
+    resolved = os.path.realpath(path)
+    stat = os.stat(resolved)
+    identity = f"{resolved}\0{stat.st_size}\0{stat.st_mtime_ns}".encode()
+    return hashlib.blake2b(identity, digest_size=8).hexdigest()
+
 class ExecutableRecognizer(BaseRecognizer):
     """
     Reconocedor de tracks utilizando un ejecutable externo que genera un JSON.
     Especialmente adaptado para manejar el formato de track_finder.exe.
     """
     
-    def __init__(self, executable_path: str, chunk_duration: int = 30):
+    # Cada chunk es un proceso independiente: se lanzan varios a la vez, sin pasar de 8
+    max_concurrent_chunks = min(os.cpu_count() or 1, 8)
+    
+    def __init__(
+        self,
+        executable_path: str,
+        chunk_duration: int = 30,
+        max_concurrent_chunks: Optional[int] = None,
+        target_format: str = "wav",
+        silence_rms_threshold: float = SILENCE_RMS_THRESHOLD,
+        perceptual_threshold: float = 0.0,
+    ):
         """
         Inicializa el reconocedor basado en un ejecutable externo.
         
         Args:
             executable_path: Ruta al ejecutable que realiza el reconocimiento
             chunk_duration: Duración en segundos de cada fragmento de audio
+            max_concurrent_chunks: Procesos del ejecutable que se lanzan a la vez
+            target_format: Formato en el que se escriben los chunks ("wav" o "mp3")
+            silence_rms_threshold: Energía RMS mínima para reconocer un chunk (0 lo desactiva)
+            perceptual_threshold: Distancia coseno máxima entre huellas perceptuales para reutilizar
+                el resultado de un match reciente sin lanzar el ejecutable (0 lo desactiva; ~0.15)
         """
-        super().__init__(chunk_duration)
+        super().__init__(chunk_duration, max_concurrent_chunks)
+        if target_format not in CHUNK_CODEC_ARGS:
+            raise ValueError(f"Formato de chunk no soportado: {target_format}")
         self.executable_path = executable_path
+        self.target_format = target_format
+        self.silence_rms_threshold = silence_rms_threshold
+        self.perceptual_threshold = perceptual_threshold
+        # TRACKFINDER_DEBUG=1 guarda la salida JSON del ejecutable de cada chunk
+        self._debug = os.getenv("TRACKFINDER_DEBUG") == "1"
         
         # Verificar que el ejecutable exista
         logger.info(f"Verificando existencia del ejecutable en: {executable_path}")
         
-        if not os.path.exists(executable_path):
+        found_path = _resolve_executable(executable_path)
+        if found_path is None:
             logger.error(f"El ejecutable no existe en la ruta: {executable_path}")
             logger.error(f"Directorio actual: {os.getcwd()}")
-            
-            # Verificar si existe en rutas relativas comunes para ayudar al usuario
-            common_paths = [
-                os.path.join(os.getcwd(), executable_path),
-                os.path.join(os.getcwd(), "recognizers", os.path.basename(executable_path)),
-                os.path.join(os.getcwd(), os.path.basename(executable_path))
-            ]
-            
-            # Buscar en rutas alternativas
-            found_path = None
-            for path in common_paths:
-                if os.path.exists(path):
-                    logger.info(f"El ejecutable se encontró en: {path}")
-                    logger.info(f"Usando esta ruta en lugar de la original")
-                    found_path = path
-                    break
-            
-            if found_path:
-                # Usar la ruta donde se encontró el ejecutable
-                self.executable_path = found_path
-                logger.info(f"Se actualizó la ruta del ejecutable a: {self.executable_path}")
-            else:
-                # No se encontró en ninguna ruta alternativa
-                import pdb; pdb.set_trace()
-                raise FileNotFoundError(f"El ejecutable no existe en la ruta: {executable_path}")
+            raise FileNotFoundError(f"El ejecutable no existe en la ruta: {executable_path}")
+        
+        if found_path != executable_path:
+            # Usar la ruta donde se encontró el ejecutable
+            self.executable_path = found_path
+            logger.info(f"Se actualizó la ruta del ejecutable a: {self.executable_path}")
         else:
             logger.info(f"Ejecutable encontrado correctamente en: {executable_path}")
+        
+        cache_dir = os.path.join(RESULT_CACHE_DIR, _executable_identity(self.executable_path))
+        self._result_cache = ResultCache(cache_dir, RESULT_MEMO_SIZE)
     
     async def download_audio(self, url: str) -> Tuple[str, str]:
         """
@@ -79,23 +162,44 @@ class ExecutableRecognizer(BaseRecognizer):
         Returns:
             Tuple con (ruta_archivo, título_video)
         """
-        return download_audio(url)
+        # yt-dlp y ffmpeg bloquean, se ejecutan en un hilo para no frenar el bucle de eventos
+        return await asyncio.to_thread(download_audio, url)
     
-    def split_audio(self, audio_path: str) -> Tuple[List[str], int]:
+    def split_audio(self, audio_path: str, output_dir: str = ".") -> Tuple[List[str], int]:
         """
         Divide el archivo de audio en fragmentos para su análisis.
         
         Args:
             audio_path: Ruta al archivo de audio a dividir
+            output_dir: Directorio donde se escriben los fragmentos
             
         Returns:
             Tuple con (lista_de_chunks, duración_total_en_segundos)
         """
-        return split_audio(audio_path, self.chunk_duration)
+        return split_audio(
+            audio_path, self.chunk_duration, output_dir,
+            CHUNK_CODEC_ARGS[self.target_format], self.target_format
+        )
+    
+    def iter_chunks(self, audio_path: str, output_dir: str) -> AsyncIterator[str]:
+        """
+        Genera los fragmentos del audio en el formato configurado a medida que se escriben.
+        
+        Args:
+            audio_path: Ruta al archivo de audio a dividir
+            output_dir: Directorio donde se escriben los fragmentos
+            
+        Returns:
+            Iterador asíncrono con la ruta de cada fragmento, en orden
+        """
+        return iter_split_audio(
+            audio_path, self.chunk_duration, output_dir,
+            CHUNK_CODEC_ARGS[self.target_format], self.target_format
+        )
     
-    def _convert_to_wav(self, mp3_path: str) -> str:
+    async def _convert_to_wav(self, mp3_path: str) -> str:
         """
-        Convierte un archivo de audio MP3 a formato WAV.
+        Convierte un archivo de audio MP3 a formato WAV (mono, 16 kHz).
         
         Args:
             mp3_path: Ruta al archivo MP3
@@ -107,46 +211,104 @@ class ExecutableRecognizer(BaseRecognizer):
             # Crear nombre para archivo wav
             wav_path = os.path.splitext(mp3_path)[0] + ".wav"
             
-            # Convertir mp3 a wav usando pydub
-            audio = AudioSegment.from_file(mp3_path)
-            audio.export(wav_path, format="wav")
+            # ffmpeg decodifica y escribe el WAV en streaming, sin cargar el audio en memoria
+            process = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", mp3_path,
+                "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le", wav_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(f"ffmpeg terminó con código {process.returncode}: {stderr.decode().strip()}")
             
-            logger.info(f"Archivo convertido de MP3 a WAV: {wav_path}")
+            logger.debug("Archivo convertido de MP3 a WAV: %s", wav_path)
             return wav_path
         except Exception as e:
             logger.error(f"Error al convertir MP3 a WAV: {str(e)}")
-            import traceback
             logger.error(traceback.format_exc())
             return mp3_path  # Retornar el archivo original en caso de error
     
-    async def recognize_chunk(self, chunk_path: str) -> Optional[Dict[str, Any]]:
+    async def identify_tracks_in_file(self, audio_path: str, format_timestamps: bool = True) -> List[Dict[str, Any]]:
         """
-        Reconoce un fragmento de audio utilizando el ejecutable externo.
+        Identifica los tracks de un archivo con una caché perceptual propia de esta llamada.
+        
+        Args:
+            audio_path: Ruta al archivo de audio a analizar
+            format_timestamps: Si es False los timestamps se dejan en segundos
+            
+        Returns:
+            Lista de tracks identificados con su información
+        """
+        token = _perceptual_matches.set(collections.deque(maxlen=PERCEPTUAL_CACHE_SIZE))
+        try:
+            return await super().identify_tracks_in_file(audio_path, format_timestamps)
+        finally:
+            _perceptual_matches.reset(token)
+    
+    async def recognize_chunk(self, chunk_path: str, digest: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
+        """
+        Reconoce un fragmento de audio utilizando el ejecutable externo. Si el mismo audio
+        ya hizo match antes con este ejecutable (mismo hash de contenido) se devuelve el
+        resultado cacheado sin lanzar el proceso.
         
         Args:
             chunk_path: Ruta al archivo de chunk a reconocer
+            digest: Hash del contenido del chunk si ya se calculó
             
         Returns:
             Diccionario con los datos del reconocimiento o None si no se reconoció
         """
-        logger.info(f"Iniciando reconocimiento con ejecutable para: {chunk_path}")
-        logger.info(f"Usando ejecutable: {self.executable_path}")
+        if digest is None:
+            digest = await asyncio.to_thread(file_digest, chunk_path)
+        key = digest.hex()
+        cached = await asyncio.to_thread(self._result_cache.get, key)
+        # Las entradas sin match de versiones anteriores se ignoran y se vuelven a reconocer
+        if cached is not None and cached.get("result") is not None:
+            logger.debug("Resultado en caché para %s", chunk_path)
+            return cached["result"]
+        return await self._recognize_uncached(chunk_path, key)
+    
+    async def _recognize_uncached(self, chunk_path: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Lanza el ejecutable sobre el chunk y guarda en caché los matches; los chunks sin match
+        y los errores no se cachean para reintentarlos en la próxima ejecución.
         
-        # Verificar que el ejecutable existe antes de continuar
-        if not os.path.exists(self.executable_path):
-            logger.error(f"El ejecutable no se encuentra en la ruta especificada: {self.executable_path}")
-            return None
+        Args:
+            chunk_path: Ruta al archivo de chunk a reconocer
+            key: Hash del contenido del chunk
+            
+        Returns:
+            Diccionario con los datos del reconocimiento o None si no se reconoció
+        """
+        logger.debug("Iniciando reconocimiento con ejecutable para: %s", chunk_path)
         
-        # Verificar si es necesario convertir el archivo a WAV
-        # track_finder.exe requiere archivos WAV
-        file_ext = os.path.splitext(chunk_path)[1].lower()
+        # track_finder.exe requiere archivos WAV: con target_format="wav" los chunks ya llegan
+        # así y no se convierten; solo los chunks MP3 pasan por la conversión
         input_file = chunk_path
         
-        if file_ext != '.wav':
-            logger.info(f"Convirtiendo archivo {file_ext} a formato WAV requerido por track_finder.exe")
-            input_file = self._convert_to_wav(chunk_path)
+        if not chunk_path.lower().endswith(".wav"):
+            logger.debug("Convirtiendo %s a formato WAV requerido por track_finder.exe", chunk_path)
+            input_file = await self._convert_to_wav(chunk_path)
         
         try:
+            # Los chunks en silencio (intros, transiciones) nunca hacen match: no se lanza el proceso
+            if self.silence_rms_threshold > 0:
+                rms = await asyncio.to_thread(wav_rms, input_file)
+                if rms < self.silence_rms_threshold:
+                    logger.debug("Chunk en silencio (RMS %.1f), se omite: %s", rms, chunk_path)
+                    return None
+            
+            # Un chunk casi idéntico (misma canción en ventanas vecinas) reutiliza el último match
+            profile = None
+            recent_matches = _perceptual_matches.get()
+            if self.perceptual_threshold > 0 and recent_matches is not None:
+                profile = await asyncio.to_thread(wav_band_profile, input_file)
+                similar = self._find_similar(profile, recent_matches)
+                if similar is not None:
+                    logger.debug("Chunk similar a un match reciente, se reutiliza: %s", chunk_path)
+                    return similar
+            
             # Crear comando con parámetros para el ejecutable
             # Adaptado para track_finder.exe que usa --search y --json como parámetros
             command = [
@@ -156,7 +318,8 @@ class ExecutableRecognizer(BaseRecognizer):
                 "--json"
             ]
             
-            logger.info(f"Ejecutando comando: {' '.join(command)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Ejecutando comando: %s", " ".join(command))
             
             # Ejecutar el proceso de reconocimiento como una tarea asincrónica
             # para no bloquear el bucle de eventos
@@ -175,46 +338,72 @@ class ExecutableRecognizer(BaseRecognizer):
                 logger.error(f"Error en el ejecutable (código {process.returncode}): {stderr_text}")
                 return None
             
-            # Intentar parsear la salida como JSON
+            # Intentar parsear la salida como JSON (orjson lee los bytes directamente)
             try:
-                output = stdout.decode().strip()
-                # Guardar la salida en un archivo para depuración si es necesario
-                with open(f"track_finder_output_{os.path.basename(input_file)}.json", "w") as f:
-                    f.write(output)
-                    
-                logger.info(f"Salida del ejecutable guardada en track_finder_output_{os.path.basename(input_file)}.json")
+                # Guardar la salida en un archivo solo en modo depuración, fuera del bucle de eventos
+                if self._debug:
+                    debug_path = f"track_finder_output_{os.path.basename(input_file)}.json"
+                    await asyncio.to_thread(Path(debug_path).write_bytes, stdout)
+                    logger.info(f"Salida del ejecutable guardada en {debug_path}")
                 
-                result = json.loads(output)
-                logger.info(f"Reconocimiento exitoso con ejecutable")
+                result = orjson.loads(stdout)
+                logger.debug("Reconocimiento exitoso con ejecutable")
                 
                 # Verificar si el resultado contiene información de track
                 if self._validate_result(result):
                     # Transformar el resultado al formato interno estándar
-                    return self._transform_result(result)
+                    transformed = self._transform_result(result)
+                    await asyncio.to_thread(self._result_cache.set, key, {"result": transformed})
+                    if profile is not None:
+                        recent_matches.append((profile, transformed))
+                    return transformed
                 else:
-                    logger.warning("El resultado no contiene información de track válida o no hizo match")
-                    logger.info(f"Resultado recibido: {output[:200]}...")  # Mostrar inicio del resultado
+                    logger.debug("El resultado no contiene información de track válida o no hizo match")
+                    logger.debug("Resultado recibido: %s...", stdout[:200])  # Mostrar inicio del resultado
                     return None
                 
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 logger.error("La salida del ejecutable no es un JSON válido")
                 logger.error(f"Salida: {stdout.decode().strip()}")
                 return None
                 
         except Exception as e:
             logger.error(f"Error en el reconocimiento con ejecutable: {str(e)}")
-            import traceback
             logger.error(traceback.format_exc())
             return None
         finally:
-            # Limpiar: eliminar el archivo wav si es diferente del chunk original
-            if input_file != chunk_path and os.path.exists(input_file):
+            # Limpiar: eliminar el archivo wav si es diferente del chunk original (en un hilo,
+            # para no frenar al resto de chunks que se están reconociendo a la vez)
+            if input_file != chunk_path:
                 try:
-                    os.remove(input_file)
-                    logger.debug(f"Archivo WAV temporal eliminado: {input_file}")
+                    await asyncio.to_thread(os.remove, input_file)
+                    logger.debug("Archivo WAV temporal eliminado: %s", input_file)
+                except FileNotFoundError:
+                    pass
                 except Exception as e:
                     logger.warning(f"No se pudo eliminar el archivo WAV temporal: {str(e)}")
     
+    def _find_similar(self, profile, recent_matches: collections.deque) -> Optional[Dict[str, Any]]:
+        """
+        Busca entre los matches recientes del archivo uno cuya huella perceptual esté a menos de
+        perceptual_threshold de distancia coseno.
+        
+        Args:
+            profile: Huella perceptual del chunk (ver wav_band_profile) o None
+            recent_matches: Cola de (huella, resultado) de los matches recientes del archivo
+            
+        Returns:
+            Resultado del match más cercano o None si ninguno es suficientemente similar
+        """
+        if profile is None:
+            return None
+        best_result, best_distance = None, self.perceptual_threshold
+        for cached_profile, cached_result in recent_matches:
+            distance = 1.0 - float(profile @ cached_profile)
+            if distance < best_distance:
+                best_result, best_distance = cached_result, distance
+        return best_result
+    
     def _validate_result(self, result: Dict[str, Any]) -> bool:
         """
         Valida que el resultado contenga los campos necesarios según el formato de track_finder.exe.
@@ -225,18 +414,12 @@ class ExecutableRecognizer(BaseRecognizer):
         Returns:
             True si el resultado es válido y contiene match, False en caso contrario
         """
-        # Verificamos que el resultado sea exitoso y haya match
-        if not result.get("success", False) or not result.get("matched", False):
-            return False
-        
-        # Verificamos que exista la sección 'audio' con la información del track
-        if "audio" not in result:
-            return False
-        
-        # Verificamos los campos mínimos necesarios en la sección 'audio'
-        audio = result["audio"]
-        required_fields = ["title", "artist", "confidence"]
-        return all(field in audio for field in required_fields)
+        # Resultado exitoso, con match y con la sección 'audio' con los campos mínimos del track
+        audio = result.get("audio")
+        return bool(
+            result.get("success") and result.get("matched") and audio is not None
+            and "title" in audio and "artist" in audio and "confidence" in audio
+        )
     
     def _transform_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -276,54 +459,41 @@ class ExecutableRecognizer(BaseRecognizer):
             Lista de tracks identificados con su información
         """
         logger.info("Procesando resultados del reconocedor ejecutable")
-        raw_tracks = []
+        # Extraer información básica de cada resultado (ya transformado al formato interno);
+        # la firma normalizada se calcula una sola vez por track
+        raw_tracks = [
+            _TrackGroup(result["title"], result["artist"], i, result["confidence"], track_signature(result))
+            for i, result in enumerate(results) if result
+        ]
         
-        # Extraer información básica de cada resultado
-        for i, result in enumerate(results):
-            if result:
-                # Los resultados ya están transformados al formato interno
-                track = {
-                    "title": result["title"],
-                    "artist": result["artist"],
-                    "timestamp": i * self.chunk_duration,
-                    "confidence": result["confidence"],
-                    "recognizer": "track_finder"  # Nombre más específico
-                }
-                raw_tracks.append(track)
-        
-        # Consolidar tracks (eliminar duplicados consecutivos)
-        consolidated_tracks = []
+        # Consolidar tracks (eliminar duplicados consecutivos). En una mezcla larga casi todos
+        # los chunks repiten el track anterior: si la firma es idéntica no hace falta la
+        # comparación difusa
+        groups: List[_TrackGroup] = []
         current_track = None
         
         for track in raw_tracks:
-            if not current_track:
-                current_track = track
-                continue
-            
             # Si el track actual es similar al anterior, lo ignoramos
-            if are_tracks_similar(current_track, track):
+            if current_track and are_signatures_similar(current_track.signature, track.signature):
                 # Actualizar la confianza si la nueva es mayor
-                if track["confidence"] > current_track["confidence"]:
-                    current_track["confidence"] = track["confidence"]
+                if track.confidence > current_track.confidence:
+                    current_track.confidence = track.confidence
                 continue
-            else:
-                # Si es diferente, guardamos el anterior y actualizamos el actual
-                consolidated_tracks.append(current_track)
-                current_track = track
-        
-        # Agregar el último track si existe
-        if current_track:
-            consolidated_tracks.append(current_track)
+            # Si es diferente, pasa a ser el track actual
+            current_track = track
+            groups.append(current_track)
         
-        # Formatear los timestamps como strings (MM:SS o HH:MM:SS)
-        for track in consolidated_tracks:
-            seconds = track["timestamp"]
-            mins, secs = divmod(seconds, 60)
-            hours, mins = divmod(mins, 60)
-            if hours > 0:
-                track["timestamp"] = f"{hours:02d}:{mins:02d}:{secs:02d}"
-            else:
-                track["timestamp"] = f"{mins:02d}:{secs:02d}"
+        # Solo los tracks consolidados se convierten a dict
+        consolidated_tracks = [
+            {
+                "title": group.title,
+                "artist": group.artist,
+                "timestamp": group.start * self.chunk_duration,
+                "confidence": group.confidence,
+                "recognizer": "track_finder"  # Nombre más específico
+            }
+            for group in groups
+        ]
         
         logger.info(f"Se procesaron {len(consolidated_tracks)} tracks únicos")
         return consolidated_tracks 
\ No newline at end of file
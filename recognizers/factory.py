@@ -1,17 +1,11 @@
+import functools
+import importlib
 import logging
-from typing import Dict, Type, Optional, List
+import traceback
+from typing import Dict, Type, Optional, List, Union
 
 from recognizers.base_recognizer import BaseRecognizer
-from recognizers.shazam_recognizer import ShazamRecognizer
-from recognizers.acoustid_recognizer import AcoustIDRecognizer
-from recognizers.executable_recognizer import ExecutableRecognizer
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
 logger = logging.getLogger(__name__)
 
 class RecognizerFactory:
@@ -20,14 +14,30 @@ class RecognizerFactory:
     Sigue el patrón Factory Method.
     """
     
-    # Registro de reconocedores disponibles
-    _recognizers: Dict[str, Type[BaseRecognizer]] = {
-        "shazam": ShazamRecognizer,
-        "acoustid": AcoustIDRecognizer,
-        "executable": ExecutableRecognizer,
-        "track_finder": ExecutableRecognizer  # Alias para el reconocedor basado en track_finder.exe
+    # Registro de reconocedores disponibles. Los integrados se indican como "módulo:Clase" y
+    # se importan la primera vez que se piden, así no se cargan shazamio, aiohttp, etc. si no se usan
+    _recognizers: Dict[str, Union[str, Type[BaseRecognizer]]] = {
+        "shazam": "recognizers.shazam_recognizer:ShazamRecognizer",
+        "acoustid": "recognizers.acoustid_recognizer:AcoustIDRecognizer",
+        "executable": "recognizers.executable_recognizer:ExecutableRecognizer",
+        "track_finder": "recognizers.executable_recognizer:ExecutableRecognizer"  # Alias para el reconocedor basado en track_finder.exe
     }
     
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _import_recognizer(spec: str) -> Type[BaseRecognizer]:
+        """
+        Importa la clase de un reconocedor a partir de su ruta "módulo:Clase".
+        
+        Args:
+            spec: Ruta de la clase del reconocedor
+            
+        Returns:
+            Clase del reconocedor
+        """
+        module_path, class_name = spec.split(":")
+        return getattr(importlib.import_module(module_path), class_name)
+    
     @classmethod
     def get_recognizer(cls, recognizer_type: str, **kwargs) -> Optional[BaseRecognizer]:
         """
@@ -47,12 +57,14 @@ class RecognizerFactory:
             return None
         
         try:
+            if isinstance(recognizer_class, str):
+                recognizer_class = cls._import_recognizer(recognizer_class)
+            
             # Mostrar los parámetros recibidos para ayudar a depurar
             logger.info(f"Creando reconocedor de tipo '{recognizer_type}' con parámetros: {kwargs}")
             return recognizer_class(**kwargs)
         except Exception as e:
             logger.error(f"Error al crear reconocedor '{recognizer_type}': {str(e)}")
-            import traceback
             logger.error(traceback.format_exc())
             return None
     
@@ -1,19 +1,20 @@
 import asyncio
+import itertools
 import logging
+import operator
+import traceback
 from typing import List, Dict, Any, Optional, Union, Tuple
 import uuid
 import os
+import tempfile
 from datetime import datetime
 
+import orjson
+
 from recognizers.base_recognizer import BaseRecognizer
 from recognizers.factory import RecognizerFactory
+from recognizers.utils import download_audio, are_tracks_similar, track_signature, format_time, parse_time, tmp_root
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
 logger = logging.getLogger(__name__)
 
 class TrackRecognitionManager:
@@ -30,6 +31,8 @@ class TrackRecognitionManager:
             output_dir: Directorio donde se guardarán los resultados
         """
         self.output_dir = output_dir
+        # Reconocedores ya creados, reutilizados entre sesiones (clave: tipo + parámetros)
+        self._recognizers: Dict[Tuple[str, Tuple], BaseRecognizer] = {}
         self._ensure_output_dir()
     
     def _ensure_output_dir(self) -> None:
@@ -40,6 +43,93 @@ class TrackRecognitionManager:
             os.makedirs(self.output_dir)
             logger.info(f"Directorio de salida creado: {self.output_dir}")
     
+    def _get_recognizer(self, recognizer_type: str, params: Dict[str, Any]) -> Optional[BaseRecognizer]:
+        """
+        Devuelve el reconocedor para el tipo y parámetros dados, creándolo solo la primera vez.
+        
+        Args:
+            recognizer_type: Tipo de reconocedor
+            params: Parámetros específicos para el reconocedor
+            
+        Returns:
+            Instancia del reconocedor o None si no se pudo crear
+        """
+        key = (recognizer_type.lower(), tuple(sorted(params.items())))
+        recognizer = self._recognizers.get(key)
+        if recognizer is None:
+            recognizer = RecognizerFactory.get_recognizer(recognizer_type, **params)
+            if recognizer is not None:
+                self._recognizers[key] = recognizer
+        return recognizer
+    
+    async def prewarm(
+        self,
+        recognizer_types: List[str],
+        recognizer_params: Dict[str, Dict[str, Any]] = None
+    ) -> None:
+        """
+        Crea por adelantado los reconocedores indicados para que la primera petición no pague su inicialización.
+        
+        Args:
+            recognizer_types: Lista de tipos de reconocedores a preparar
+            recognizer_params: Parámetros específicos para cada reconocedor
+        """
+        if recognizer_params is None:
+            recognizer_params = {}
+        for recognizer_type in recognizer_types:
+            if self._get_recognizer(recognizer_type, recognizer_params.get(recognizer_type, {})):
+                logger.info(f"Reconocedor '{recognizer_type}' preparado")
+    
+    async def aclose(self) -> None:
+        """
+        Libera los recursos de los reconocedores creados (sesiones HTTP, procesos, etc).
+        """
+        for recognizer in self._recognizers.values():
+            aclose = getattr(recognizer, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception as e:
+                    logger.error(f"Error al cerrar el reconocedor {recognizer.name}: {str(e)}")
+        self._recognizers.clear()
+    
+    async def _run_recognizer(
+        self,
+        recognizer_type: str,
+        params: Dict[str, Any],
+        audio_path: str
+    ) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        """
+        Ejecuta un reconocedor sobre el audio ya descargado.
+        
+        Args:
+            recognizer_type: Tipo de reconocedor a utilizar
+            params: Parámetros específicos para el reconocedor
+            audio_path: Ruta al archivo de audio descargado
+            
+        Returns:
+            Tuple con (tracks, mensaje_de_error); uno de los dos es None
+        """
+        try:
+            # Obtener (o crear) el reconocedor
+            recognizer = self._get_recognizer(recognizer_type, params)
+            
+            if not recognizer:
+                return None, f"No se pudo crear el reconocedor '{recognizer_type}'"
+            
+            # Ejecutar reconocimiento
+            logger.info(f"Iniciando reconocimiento con {recognizer_type}")
+            # Los timestamps quedan en segundos hasta combinar los tracklists
+            tracks = await recognizer.identify_tracks_in_file(audio_path, format_timestamps=False)
+            logger.info(f"Reconocimiento con {recognizer_type} completado: {len(tracks)} tracks encontrados")
+            return tracks, None
+            
+        except Exception as e:
+            error_msg = f"Error en el reconocedor '{recognizer_type}': {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return None, error_msg
+    
     async def identify_tracks(
         self, 
         url: str, 
@@ -73,45 +163,45 @@ class TrackRecognitionManager:
         combined_results = []
         errors = []
         
-        # Crear y ejecutar cada reconocedor
-        for recognizer_type in recognizer_types:
+        # El audio se descarga una sola vez, en un directorio propio de esta sesión,
+        # y todos los reconocedores lo analizan a la vez
+        with tempfile.TemporaryDirectory(prefix=f"session_{session_id}_", dir=tmp_root()) as session_dir:
             try:
-                # Obtener parámetros específicos para este reconocedor
-                params = recognizer_params.get(recognizer_type, {})
-                
-                # Crear reconocedor
-                recognizer = RecognizerFactory.get_recognizer(recognizer_type, **params)
-                
-                if not recognizer:
-                    errors.append(f"No se pudo crear el reconocedor '{recognizer_type}'")
-                    continue
-                
-                # Ejecutar reconocimiento
-                logger.info(f"Iniciando reconocimiento con {recognizer_type}")
-                tracks = await recognizer.identify_tracks(url)
-                
-                # Guardar resultados
-                all_results[recognizer_type] = tracks
-                
-                # Agregar a los resultados combinados
-                for track in tracks:
-                    # Asegurarnos de que el track tiene el campo de reconocedor
-                    if "recognizer" not in track:
-                        track["recognizer"] = recognizer_type
-                    combined_results.append(track)
-                
-                logger.info(f"Reconocimiento con {recognizer_type} completado: {len(tracks)} tracks encontrados")
-                
+                audio_path, video_title = await asyncio.to_thread(download_audio, url, session_dir)
             except Exception as e:
-                error_msg = f"Error en el reconocedor '{recognizer_type}': {str(e)}"
-                logger.error(error_msg)
-                import traceback
-                logger.error(traceback.format_exc())
-                errors.append(error_msg)
+                audio_path = None
+                errors.append(f"Error al descargar el audio: {str(e)}")
+            
+            if audio_path:
+                outcomes = await asyncio.gather(*(
+                    self._run_recognizer(recognizer_type, recognizer_params.get(recognizer_type, {}), audio_path)
+                    for recognizer_type in recognizer_types
+                ))
+                
+                for recognizer_type, (tracks, error_msg) in zip(recognizer_types, outcomes):
+                    if error_msg:
+                        errors.append(error_msg)
+                        continue
+                    
+                    # Guardar resultados
+                    all_results[recognizer_type] = tracks
+                    
+                    # Agregar a los resultados combinados
+                    for track in tracks:
+                        # Asegurarnos de que el track tiene el campo de reconocedor
+                        if "recognizer" not in track:
+                            track["recognizer"] = recognizer_type
+                        combined_results.append(track)
         
         # Ordenar resultados combinados por timestamp
         combined_results = self._sort_and_deduplicate_tracks(combined_results)
         
+        # Formatear los timestamps una sola vez, ya combinados. Los tracks combinados son los
+        # mismos dicts que los de cada reconocedor, así que basta con recorrer estos últimos
+        for track in itertools.chain.from_iterable(all_results.values()):
+            if not isinstance(track["timestamp"], str):
+                track["timestamp"] = format_time(track["timestamp"])
+        
         # Crear resultado final
         result = {
             "id": session_id,
@@ -125,10 +215,21 @@ class TrackRecognitionManager:
         }
         
         # Guardar resultados
-        self._save_results(result, session_id)
+        await asyncio.to_thread(self._save_results, result, session_id)
         
         return result
     
+    @staticmethod
+    def _merge_duplicate(kept: Dict[str, Any], duplicate: Dict[str, Any]) -> None:
+        """
+        Si el duplicado tiene mayor confianza, copia su información al track que se conserva
+        manteniendo el timestamp original.
+        """
+        if duplicate.get("confidence", 0) > kept.get("confidence", 0):
+            for key in ["title", "artist", "confidence", "recognizer"]:
+                if key in duplicate:
+                    kept[key] = duplicate[key]
+    
     def _sort_and_deduplicate_tracks(self, tracks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Ordena y elimina duplicados de la lista de tracks.
@@ -142,58 +243,59 @@ class TrackRecognitionManager:
         if not tracks:
             return []
         
-        # Primero convertimos los timestamps a segundos para poder ordenar
-        for track in tracks:
-            if isinstance(track["timestamp"], str):
-                parts = track["timestamp"].split(":")
-                if len(parts) == 2:  # MM:SS
-                    mins, secs = parts
-                    track["_timestamp_seconds"] = int(mins) * 60 + int(secs)
-                elif len(parts) == 3:  # HH:MM:SS
-                    hours, mins, secs = parts
-                    track["_timestamp_seconds"] = int(hours) * 3600 + int(mins) * 60 + int(secs)
-                else:
-                    track["_timestamp_seconds"] = 0
-            else:
-                track["_timestamp_seconds"] = track["timestamp"]
+        # Ordenar por tiempo. Los segundos de cada track se calculan una vez y viajan junto
+        # al track, sin añadir campos temporales a los dicts
+        timed_tracks = sorted(
+            ((self._timestamp_seconds(track), track) for track in tracks),
+            key=operator.itemgetter(0)
+        )
+        window_size = 30  # segundos de ventana para considerar duplicados
         
-        # Ordenar por tiempo
-        sorted_tracks = sorted(tracks, key=lambda x: x["_timestamp_seconds"])
+        # Primera pasada: los duplicados exactos (misma firma normalizada en la misma ventana) se
+        # resuelven con un dict, una búsqueda por track, aunque otro track quede intercalado entre
+        # ellos. El dict conserva el orden de inserción, que ya es el orden por tiempo.
+        best: Dict[Tuple[str, str, int], Tuple[int, Dict[str, Any]]] = {}
+        for seconds, track in timed_tracks:
+            key = (*track_signature(track), seconds // window_size)
+            kept = best.setdefault(key, (seconds, track))[1]
+            if kept is not track:
+                self._merge_duplicate(kept, track)
         
-        # Eliminar duplicados cercanos (mismo título y artista en timestamps cercanos)
+        # Segunda pasada: duplicados aproximados entre tracks vecinos (otra grafía, o el mismo
+        # track a ambos lados del límite de una ventana)
         deduped_tracks = []
-        window_size = 30  # segundos de ventana para considerar duplicados
+        last_seconds = None
         
-        for track in sorted_tracks:
+        for seconds, track in best.values():
             # Si la lista está vacía, agregamos el primer track
             if not deduped_tracks:
                 deduped_tracks.append(track)
+                last_seconds = seconds
                 continue
             
             # Verificar si el track es similar a alguno reciente dentro de la ventana
             last_track = deduped_tracks[-1]
-            time_diff = abs(track["_timestamp_seconds"] - last_track["_timestamp_seconds"])
+            time_diff = abs(seconds - last_seconds)
             
             # Si el tiempo es cercano y el título/artista son similares, actualizamos la confianza
-            from recognizers.utils import are_tracks_similar
             if time_diff <= window_size and are_tracks_similar(track, last_track):
-                # Si el nuevo track tiene mayor confianza, actualizamos la información
-                if track.get("confidence", 0) > last_track.get("confidence", 0):
-                    # Actualizamos la información pero mantenemos el timestamp original
-                    for key in ["title", "artist", "confidence", "recognizer"]:
-                        if key in track:
-                            last_track[key] = track[key]
+                self._merge_duplicate(last_track, track)
             else:
                 # Si no es similar o está fuera de la ventana, lo agregamos como nuevo track
                 deduped_tracks.append(track)
-        
-        # Eliminar el campo temporal de segundos
-        for track in deduped_tracks:
-            if "_timestamp_seconds" in track:
-                del track["_timestamp_seconds"]
+                last_seconds = seconds
         
         return deduped_tracks
     
+    @staticmethod
+    def _timestamp_seconds(track: Dict[str, Any]) -> int:
+        """
+        Timestamp del track en segundos. Los reconocedores integrados ya lo entregan en segundos;
+        los formateados (MM:SS o HH:MM:SS, p. ej. de reconocedores registrados aparte) se convierten.
+        """
+        timestamp = track["timestamp"]
+        return parse_time(timestamp) if isinstance(timestamp, str) else timestamp
+    
     def _save_results(self, result: Dict[str, Any], session_id: str) -> None:
         """
         Guarda los resultados en un archivo JSON.
@@ -203,15 +305,14 @@ class TrackRecognitionManager:
             session_id: ID de la sesión
         """
         try:
-            import json
-            from datetime import datetime
-            
             # Crear nombre de archivo con timestamp
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"{self.output_dir}/tracklist_{session_id}_{timestamp}.json"
             
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
+            # orjson serializa directamente a bytes UTF-8 (sin escapar caracteres no ASCII)
+            data = orjson.dumps(result, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            with open(filename, 'wb') as f:
+                f.write(data)
             
             logger.info(f"Resultados guardados en: {filename}")
         except Exception as e:
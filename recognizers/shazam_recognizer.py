@@ -1,35 +1,142 @@
 import asyncio
+import itertools
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+import traceback
+import operator
+from typing import List, Dict, Any, Tuple, Optional, Union
 
+import aiohttp
+from aiohttp import ClientError, ClientResponseError
+from aiohttp_retry import ExponentialRetry, RetryClient
 from shazamio import Shazam
-from aiohttp import ClientError, ContentTypeError
+from shazamio.client import HTTPClient
+from shazamio.exceptions import BadMethod, FailedDecodeJson
+from shazamio.utils import validate_json
 
 from recognizers.base_recognizer import BaseRecognizer
-from recognizers.utils import download_audio, split_audio, ExponentialBackoff, are_tracks_similar
-
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
+from recognizers.utils import (
+    download_audio,
+    split_audio,
+    audio_rms,
+    ExponentialBackoff,
+    AdaptiveConcurrencyLimiter,
+    track_signature,
+    are_signatures_similar,
+    file_digest,
+    ResultCache,
 )
+
 logger = logging.getLogger(__name__)
 
+# Respuestas de Shazam por hash del contenido del chunk, reutilizadas en reintentos y re-ejecuciones
+RESULT_CACHE_DIR = ".shazam_cache"
+RESULT_MEMO_SIZE = 1024
+
+# Por debajo de esta energía RMS (muestras de 16 bits) el chunk se considera silencio y no
+# se envía a Shazam
+SILENCE_RMS_THRESHOLD = 100
+
+# Fragmentos del mensaje de error que indican un límite de peticiones o una sobrecarga pasajera
+RETRYABLE_ERROR_MARKERS = ("429", "rate limit", "too many requests", "quota", "failed to decode json")
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Indica si un error de Shazam es pasajero (límite de peticiones, sobrecarga) y merece reintento.
+    """
+    if isinstance(error, ClientResponseError) and 400 <= error.status < 500:
+        return error.status == 429
+    if isinstance(error, (ClientError, asyncio.TimeoutError, FailedDecodeJson)):
+        # Shazam responde a los 429 con una página HTML que shazamio convierte en FailedDecodeJson
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_ERROR_MARKERS)
+
+class PooledHTTPClient(HTTPClient):
+    """
+    Cliente HTTP para shazamio que reutiliza una única sesión aiohttp entre peticiones.
+    El cliente por defecto abre una sesión (y una conexión TCP+TLS) nueva en cada reconocimiento.
+    """
+    
+    def __init__(self, retry_options: Optional[ExponentialRetry] = None):
+        # Mismos reintentos que usa shazamio cuando no se le pasa un cliente
+        super().__init__(retry_options or ExponentialRetry(
+            attempts=20,
+            max_timeout=60,
+            statuses={500, 502, 503, 504, 429},
+        ))
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._client: Optional[RetryClient] = None
+    
+    def _get_client(self) -> RetryClient:
+        """
+        Devuelve el cliente con reintentos, creando la sesión en el primer uso (dentro del bucle de eventos).
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=32, limit_per_host=16, ttl_dns_cache=300, keepalive_timeout=60
+                ),
+                trace_configs=[self.trace_config],
+            )
+            self._client = RetryClient(
+                client_session=self._session,
+                retry_options=self.retry_options,
+                raise_for_status=False,
+            )
+        return self._client
+    
+    async def request(self, method: str, url: str, *args, **kwargs) -> Union[List[Any], Dict[str, Any]]:
+        client = self._get_client()
+        if method.upper() == "GET":
+            async with client.get(url, **kwargs) as resp:
+                return await validate_json(resp, *args)
+        elif method.upper() == "POST":
+            async with client.post(url, **kwargs) as resp:
+                return await validate_json(resp, *args)
+        raise BadMethod("Accept only GET/POST")
+    
+    async def aclose(self) -> None:
+        """
+        Cierra la sesión compartida si está abierta.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._client = None
+
 class ShazamRecognizer(BaseRecognizer):
     """
     Reconocedor de tracks utilizando la API de Shazam.
     """
     
-    def __init__(self, chunk_duration: int = 30):
+    # Techo de chunks en vuelo; el límite efectivo lo ajusta el limitador adaptativo
+    max_concurrent_chunks = 16
+    
+    def __init__(self, chunk_duration: int = 30, silence_rms_threshold: float = SILENCE_RMS_THRESHOLD):
         """
         Inicializa el reconocedor de Shazam.
         
         Args:
             chunk_duration: Duración en segundos de cada fragmento de audio
+            silence_rms_threshold: Energía RMS mínima para reconocer un chunk (0 lo desactiva)
         """
         super().__init__(chunk_duration)
-        self.shazam = Shazam()
+        self.silence_rms_threshold = silence_rms_threshold
+        self._http_client = PooledHTTPClient()
+        self.shazam = Shazam(http_client=self._http_client)
+        self._limiter = AdaptiveConcurrencyLimiter(
+            # Solo los errores que merecen reintento reducen la concurrencia; un 4xx no
+            is_overload=is_retryable_error,
+            initial_concurrency=2,
+            max_concurrency=self.max_concurrent_chunks,
+        )
+        self._result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_MEMO_SIZE)
+    
+    async def aclose(self) -> None:
+        """
+        Cierra la sesión HTTP usada para hablar con Shazam.
+        """
+        await self._http_client.aclose()
     
     async def download_audio(self, url: str) -> Tuple[str, str]:
         """
@@ -41,69 +148,121 @@ class ShazamRecognizer(BaseRecognizer):
         Returns:
             Tuple con (ruta_archivo, título_video)
         """
-        return download_audio(url)
+        # yt-dlp y ffmpeg bloquean, se ejecutan en un hilo para no frenar el bucle de eventos
+        return await asyncio.to_thread(download_audio, url)
     
-    def split_audio(self, audio_path: str) -> Tuple[List[str], int]:
+    def split_audio(self, audio_path: str, output_dir: str = ".") -> Tuple[List[str], int]:
         """
         Divide el archivo de audio en fragmentos para su análisis.
         
         Args:
             audio_path: Ruta al archivo de audio a dividir
+            output_dir: Directorio donde se escriben los fragmentos
             
         Returns:
             Tuple con (lista_de_chunks, duración_total_en_segundos)
         """
-        return split_audio(audio_path, self.chunk_duration)
+        return split_audio(audio_path, self.chunk_duration, output_dir)
     
-    async def recognize_chunk(self, chunk_path: str) -> Optional[Dict[str, Any]]:
+    async def recognize_chunk(self, chunk_path: str, digest: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
         """
-        Reconoce un fragmento de audio utilizando Shazam.
+        Reconoce un fragmento de audio utilizando Shazam. Si el mismo audio ya se
+        reconoció antes (mismo hash de contenido) se devuelve la respuesta cacheada
+        sin llamar a la API, y los chunks en silencio no se envían.
         
         Args:
             chunk_path: Ruta al archivo de chunk a reconocer
+            digest: Hash del contenido del chunk si ya se calculó
             
         Returns:
             Diccionario con los datos del reconocimiento o None si no se reconoció
         """
-        logger.info(f"Iniciando reconocimiento de chunk con Shazam: {chunk_path}")
+        if digest is None:
+            digest = await asyncio.to_thread(file_digest, chunk_path)
+        key = digest.hex()
+        cached = await asyncio.to_thread(self._result_cache.get, key)
+        # Las entradas sin match de versiones anteriores se ignoran y se vuelven a consultar
+        if cached is not None and cached.get("result") is not None:
+            logger.info("Resultado de Shazam en caché para %s", chunk_path)
+            return cached["result"]
+        
+        # El chunk se queda en MP3 (el que se cachea por hash); la energía se mide sobre el
+        # PCM decodificado en memoria
+        if self.silence_rms_threshold > 0:
+            try:
+                rms = await asyncio.to_thread(audio_rms, chunk_path)
+            except Exception as e:
+                logger.warning("No se pudo medir la energía de %s: %s", chunk_path, e)
+            else:
+                if rms < self.silence_rms_threshold:
+                    logger.info("Chunk en silencio (RMS %.1f), se omite: %s", rms, chunk_path)
+                    return None
+        
+        return await self._recognize_uncached(chunk_path, key)
+    
+    async def _recognize_uncached(self, chunk_path: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Consulta Shazam y guarda en caché los matches (los chunks sin match no se cachean).
+        Los errores pasajeros (conexión, 429, respuestas no JSON) se reintentan en un bucle
+        con un único ExponentialBackoff por chunk y no se cachean.
+        
+        Args:
+            chunk_path: Ruta al archivo de chunk a reconocer
+            key: Hash del contenido del chunk
+            
+        Returns:
+            Diccionario con los datos del reconocimiento o None si no se reconoció
+        """
+        logger.info("Iniciando reconocimiento de chunk con Shazam: %s", chunk_path)
         backoff = ExponentialBackoff()
         
+        # La firma se calcula en local (shazamio_core) una sola vez por chunk y fuera del limitador:
+        # los reintentos solo reenvían la petición con la firma ya calculada
         try:
-            # Esperar un poco para no sobrecargar la API
-            await asyncio.sleep(5)
-            
-            # Realizar el reconocimiento
-            result = await self.shazam.recognize(chunk_path)
-            
-            if not result or "matches" not in result or not result["matches"]:
-                logger.warning(f"No se encontraron matches en {chunk_path}")
-                return None
-            
-            if "track" in result:
-                logger.info(
-                    f"Canción identificada en {chunk_path}: {result['track']['title']} - {result['track']['subtitle']}"
-                )
-                return result
-            else:
-                logger.warning(f"No se pudo identificar la canción en {chunk_path}")
-                return None
-                
-        except (ClientError, ContentTypeError) as e:
-            next_delay = backoff.get_next_delay()
-            if next_delay is not None:
+            signature = await self.shazam.core_recognizer.recognize_path(value=chunk_path)
+        except Exception as e:
+            logger.error("Error generando la firma de %s: %s", chunk_path, e)
+            return None
+        
+        while True:
+            try:
+                # Realizar el reconocimiento; el limitador reduce la concurrencia si Shazam se satura
+                async with self._limiter:
+                    result = await self.shazam.send_recognize_request_v2(sig=signature)
+            except Exception as e:
+                # Los errores no recuperables (4xx distintos de 429, datos inválidos) no se reintentan
+                if not is_retryable_error(e):
+                    logger.error("Error procesando %s: %s", chunk_path, e)
+                    logger.error(traceback.format_exc())
+                    return None
+                next_delay = backoff.get_next_delay()
+                if next_delay is None:
+                    logger.error("Error máximo de reintentos alcanzado para %s", chunk_path)
+                    logger.error("Error: %s", e)
+                    return None
                 logger.warning(
-                    f"Error de conexión en {chunk_path}. Reintentando en {next_delay:.1f} segundos... (Intento {backoff.retry_count}/{backoff.max_retries})"
+                    "Error de conexión en %s. Reintentando en %.1f segundos... (Intento %d/%d)",
+                    chunk_path, next_delay, backoff.retry_count, backoff.max_retries
                 )
                 await asyncio.sleep(next_delay)
-                return await self.recognize_chunk(chunk_path)
-            else:
-                logger.error(f"Error máximo de reintentos alcanzado para {chunk_path}")
-                logger.error(f"Error: {str(e)}")
-                return None
-        except Exception as e:
-            logger.error(f"Error procesando {chunk_path}: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+                continue
+            break
+        
+        if not result or "matches" not in result or not result["matches"]:
+            logger.warning("No se encontraron matches en %s", chunk_path)
+            return None
+        
+        if "track" in result:
+            logger.info(
+                "Canción identificada en %s: %s - %s",
+                chunk_path, result["track"]["title"], result["track"]["subtitle"]
+            )
+            # Solo se cachean los matches: un chunk sin match se vuelve a consultar en la próxima
+            # ejecución, por si Shazam ha incorporado el track a su catálogo
+            await asyncio.to_thread(self._result_cache.set, key, {"result": result})
+            return result
+        else:
+            logger.warning("No se pudo identificar la canción en %s", chunk_path)
             return None
     
     def process_results(self, results: List[Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
@@ -129,38 +288,21 @@ class ShazamRecognizer(BaseRecognizer):
                     "confidence": 1.0,  # Shazam no proporciona un valor de confianza
                     "recognizer": "shazam"
                 }
-                raw_tracks.append(track)
+                # La firma normalizada (título, artista) se calcula una sola vez por track
+                raw_tracks.append((track_signature(track), track))
         
-        # Consolidar tracks (eliminar duplicados consecutivos)
+        # Consolidar tracks (eliminar duplicados consecutivos). Los tramos con la misma firma
+        # se agrupan con groupby; la similitud solo se calcula en la frontera entre tramos.
         consolidated_tracks = []
-        current_track = None
+        last_signature = None
         
-        for track in raw_tracks:
-            if not current_track:
-                current_track = track
-                continue
-            
-            # Si el track actual es similar al anterior, lo ignoramos
-            if are_tracks_similar(current_track, track):
+        for signature, run in itertools.groupby(raw_tracks, key=operator.itemgetter(0)):
+            _, track = next(run)
+            # Si el track es similar al anterior, lo ignoramos
+            if consolidated_tracks and are_signatures_similar(last_signature, signature):
                 continue
-            else:
-                # Si es diferente, guardamos el anterior y actualizamos el actual
-                consolidated_tracks.append(current_track)
-                current_track = track
-        
-        # Agregar el último track si existe
-        if current_track:
-            consolidated_tracks.append(current_track)
-        
-        # Formatear los timestamps como strings (MM:SS o HH:MM:SS)
-        for track in consolidated_tracks:
-            seconds = track["timestamp"]
-            mins, secs = divmod(seconds, 60)
-            hours, mins = divmod(mins, 60)
-            if hours > 0:
-                track["timestamp"] = f"{hours:02d}:{mins:02d}:{secs:02d}"
-            else:
-                track["timestamp"] = f"{mins:02d}:{secs:02d}"
+            consolidated_tracks.append(track)
+            last_signature = signature
         
-        logger.info(f"Se procesaron {len(consolidated_tracks)} tracks únicos")
+        logger.info("Se procesaron %d tracks únicos", len(consolidated_tracks))
         return consolidated_tracks 
\ No newline at end of file
@@ -1,41 +1,82 @@
 import os
+import glob
+import asyncio
+import hashlib
+import subprocess
+import tempfile
+import threading
+import orjson
 import yt_dlp
 import logging
-import difflib
-from pydub import AudioSegment
-from typing import Tuple, List
-
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+import random
+import shutil
+import time
+import wave
+import functools
+import numpy as np
+from rapidfuzz import fuzz
+from typing import Tuple, List, AsyncIterator, Optional
+
 logger = logging.getLogger(__name__)
 
-def download_audio(url: str) -> Tuple[str, str]:
+# En Linux los archivos temporales (audio descargado y chunks) se escriben en tmpfs, en memoria,
+# siempre que quede espacio de sobra: el /dev/shm por defecto de Docker tiene solo 64 MB
+TMPFS_DIR = "/dev/shm"
+TMPFS_MIN_FREE_BYTES = 512 * 1024 * 1024
+
+def tmp_root() -> Optional[str]:
+    """
+    Directorio donde crear los archivos temporales de una sesión o de un reconocedor.
+    TRACKFINDER_TMPDIR tiene prioridad; si no, se usa /dev/shm cuando le quedan al menos
+    TMPFS_MIN_FREE_BYTES libres. Se evalúa en cada llamada porque el espacio libre cambia
+    con las peticiones en curso.
+    
+    Returns:
+        Ruta del directorio, o None para usar el directorio temporal por defecto
+    """
+    override = os.environ.get("TRACKFINDER_TMPDIR")
+    if override:
+        return override
+    try:
+        if shutil.disk_usage(TMPFS_DIR).free >= TMPFS_MIN_FREE_BYTES:
+            return TMPFS_DIR
+    except OSError:
+        pass
+    return None
+
+# Los reconocedores trabajan con audio mono de baja resolución: 64 kbps a 16 kHz basta para
+# las huellas y reduce varias veces los bytes que recorren el pipeline
+LOW_BITRATE_QUALITY = "64"
+LOW_BITRATE_ARGS = ["-ac", "1", "-ar", "16000"]
+
+def download_audio(url: str, output_dir: str = ".") -> Tuple[str, str]:
     """
     Descarga el audio de una URL (YouTube, SoundCloud, etc) usando yt-dlp.
     
     Args:
         url: URL del audio/video a descargar
+        output_dir: Directorio donde se guarda el archivo descargado
         
     Returns:
         Tuple con (ruta_archivo, título_video)
     """
     logger.info(f"Iniciando descarga de audio desde URL: {url}")
+    # FULL_QUALITY_AUDIO=1 conserva la calidad original si algún reconocedor la necesita
+    full_quality = os.getenv("FULL_QUALITY_AUDIO") == "1"
     ydl_opts = {
         "format": "bestaudio/best",
         "postprocessors": [
             {
                 "key": "FFmpegExtractAudio",
                 "preferredcodec": "mp3",
-                "preferredquality": "best",
+                "preferredquality": "best" if full_quality else LOW_BITRATE_QUALITY,
             }
         ],
-        "outtmpl": "downloaded_audio.%(ext)s",
+        "outtmpl": os.path.join(output_dir, "downloaded_audio.%(ext)s"),
         "quiet": True,
     }
+    if not full_quality:
+        ydl_opts["postprocessor_args"] = {"extractaudio": LOW_BITRATE_ARGS}
 
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
@@ -50,61 +91,245 @@ def download_audio(url: str) -> Tuple[str, str]:
         logger.error(f"Error durante la descarga del audio: {str(e)}")
         raise
 
-def split_audio(audio_path: str, chunk_duration: int = 30) -> Tuple[List[str], int]:
+def split_audio(
+    audio_path: str,
+    chunk_duration: int = 30,
+    output_dir: str = ".",
+    codec_args: Tuple[str, ...] = ("-c", "copy"),
+    extension: str = "mp3",
+) -> Tuple[List[str], int]:
     """
     Divide un archivo de audio en fragmentos de duración especificada.
     
     Args:
         audio_path: Ruta al archivo de audio
         chunk_duration: Duración en segundos de cada fragmento
+        output_dir: Directorio donde se escriben los fragmentos
+        codec_args: Argumentos de códec de ffmpeg (por defecto copia los frames sin recodificar)
+        extension: Extensión (y formato) de los fragmentos
         
     Returns:
         Tuple con (lista_de_chunks, duración_total_en_segundos)
     """
     logger.info(f"Iniciando división del audio en chunks de {chunk_duration} segundos")
     try:
-        audio = AudioSegment.from_file(audio_path)
-        chunk_ms = chunk_duration * 1000
-        chunks = []
-
-        total_chunks = len(audio) // chunk_ms + (1 if len(audio) % chunk_ms else 0)
-        logger.info(f"Total de chunks a crear: {total_chunks}")
-
-        for i in range(0, len(audio), chunk_ms):
-            chunk = audio[i : i + chunk_ms]
-            chunk_name = f"chunk_{i//1000:04d}.mp3"
-            chunk.export(chunk_name, format="mp3")
-            chunks.append(chunk_name)
-            logger.debug(f"Chunk creado: {chunk_name}")
+        # Un solo proceso ffmpeg genera todos los segmentos; por defecto copia los frames MP3
+        # sin decodificar ni recodificar
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", audio_path,
+             "-f", "segment", "-segment_time", str(chunk_duration), *codec_args,
+             "-reset_timestamps", "1", os.path.join(output_dir, f"chunk_%04d.{extension}")],
+            check=True,
+        )
+        chunks = sorted(glob.glob(os.path.join(output_dir, f"chunk_*.{extension}")))
 
         logger.info(f"División de audio completada. {len(chunks)} chunks creados")
-        return chunks, len(audio) // 1000  # Duración total en segundos
+        return chunks, get_audio_duration(audio_path)  # Duración total en segundos
     except Exception as e:
         logger.error(f"Error durante la división del audio: {str(e)}")
         raise
 
+async def iter_split_audio(
+    audio_path: str,
+    chunk_duration: int = 30,
+    output_dir: str = ".",
+    codec_args: Tuple[str, ...] = ("-c", "copy"),
+    extension: str = "mp3",
+) -> AsyncIterator[str]:
+    """
+    Divide un archivo de audio en fragmentos y entrega la ruta de cada uno en cuanto ffmpeg lo cierra,
+    de modo que el reconocimiento puede empezar mientras se siguen escribiendo los siguientes.
+    
+    Args:
+        audio_path: Ruta al archivo de audio
+        chunk_duration: Duración en segundos de cada fragmento
+        output_dir: Directorio donde se escriben los fragmentos
+        codec_args: Argumentos de códec de ffmpeg (por defecto copia los frames sin recodificar)
+        extension: Extensión (y formato) de los fragmentos
+        
+    Yields:
+        Ruta de cada fragmento terminado, en orden
+    """
+    logger.info(f"Iniciando división del audio en chunks de {chunk_duration} segundos")
+    # El segment muxer escribe el nombre de cada segmento en la lista (aquí stdout) al cerrarlo
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", audio_path,
+        "-f", "segment", "-segment_time", str(chunk_duration), *codec_args,
+        "-reset_timestamps", "1", "-segment_list", "pipe:1", "-segment_list_type", "flat",
+        os.path.join(output_dir, f"chunk_%04d.{extension}"),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    count = 0
+    try:
+        async for line in process.stdout:
+            name = line.decode().strip()
+            if name:
+                count += 1
+                yield name if os.path.isabs(name) else os.path.join(output_dir, name)
+        
+        stderr = await process.stderr.read()
+        if await process.wait() != 0:
+            raise Exception(f"ffmpeg terminó con código {process.returncode}: {stderr.decode(errors='replace')}")
+        logger.info(f"División de audio completada. {count} chunks creados")
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+def get_audio_duration(audio_path: str) -> int:
+    """
+    Obtiene la duración de un archivo de audio con ffprobe, sin decodificarlo.
+    
+    Args:
+        audio_path: Ruta al archivo de audio
+        
+    Returns:
+        Duración en segundos
+    """
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", audio_path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return int(float(result.stdout.strip()))
+
+def file_digest(path: str) -> bytes:
+    """
+    Calcula el hash BLAKE2b (16 bytes) del contenido de un archivo.
+    
+    Args:
+        path: Ruta al archivo
+        
+    Returns:
+        Digest binario del contenido
+    """
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).digest()
+
+def wav_rms(path: str) -> float:
+    """
+    Calcula la energía RMS de un archivo WAV PCM de 16 bits.
+    
+    Args:
+        path: Ruta al archivo WAV
+        
+    Returns:
+        Valor RMS de las muestras (infinito si el formato no es PCM de 16 bits)
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            return float("inf")
+        return _pcm_rms(wav.readframes(wav.getnframes()))
+
+def audio_rms(path: str) -> float:
+    """
+    Calcula la energía RMS de un archivo de audio en cualquier formato (p. ej. un chunk MP3)
+    decodificándolo con ffmpeg a PCM mono de 16 bits en memoria, sin escribir nada en disco.
+    
+    Args:
+        path: Ruta al archivo de audio
+        
+    Returns:
+        Valor RMS de las muestras
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", path,
+         "-f", "s16le", "-ac", "1", "-ar", "16000", "pipe:1"],
+        capture_output=True,
+        check=True,
+    )
+    return _pcm_rms(result.stdout)
+
+def _pcm_rms(pcm: bytes) -> float:
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    if samples.size == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(samples * samples)))
+
+def wav_band_profile(path: str, bands: int = 32, frame_size: int = 2048) -> Optional[np.ndarray]:
+    """
+    Calcula una huella perceptual barata de un WAV PCM de 16 bits: la energía media (en escala
+    logarítmica) de bandas de frecuencia espaciadas logarítmicamente entre 60 Hz y 8 kHz,
+    centrada y normalizada para compararla por similitud coseno.
+    
+    Args:
+        path: Ruta al archivo WAV
+        bands: Número de bandas de frecuencia
+        frame_size: Muestras por ventana de la FFT
+        
+    Returns:
+        Vector normalizado de longitud `bands` o None si el audio no es PCM de 16 bits o es muy corto
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            return None
+        channels = wav.getnchannels()
+        sample_rate = wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples[:samples.size - samples.size % channels].reshape(-1, channels).mean(axis=1)
+    frames = samples.size // frame_size
+    if frames == 0:
+        return None
+    
+    windows = samples[:frames * frame_size].reshape(frames, frame_size).astype(np.float32)
+    spectrum = np.mean(np.abs(np.fft.rfft(windows * np.hanning(frame_size), axis=1)) ** 2, axis=0)
+    freqs = np.fft.rfftfreq(frame_size, 1.0 / sample_rate)
+    edges = np.geomspace(60.0, min(8000.0, sample_rate / 2), bands + 1)
+    band_index = np.clip(np.searchsorted(edges, freqs) - 1, -1, bands)
+    valid = (band_index >= 0) & (band_index < bands)
+    energy = np.bincount(band_index[valid], weights=spectrum[valid], minlength=bands)
+    
+    profile = np.log10(energy + 1e-9)
+    profile -= profile.mean()
+    norm = np.linalg.norm(profile)
+    return profile / norm if norm > 0 else None
+
+@functools.lru_cache(maxsize=4096)
 def format_time(seconds: int) -> str:
     """
     Formatea segundos en formato de tiempo legible (HH:MM:SS o MM:SS).
     
     Args:
-        seconds: Tiempo en segundos
+        seconds: Tiempo en segundos (se descartan los decimales)
         
     Returns:
         String con el tiempo formateado
     """
-    mins, secs = divmod(seconds, 60)
+    mins, secs = divmod(int(seconds), 60)
     hours, mins = divmod(mins, 60)
     if hours > 0:
         return f"{hours:02d}:{mins:02d}:{secs:02d}"
     return f"{mins:02d}:{secs:02d}"
 
+@functools.lru_cache(maxsize=4096)
+def parse_time(timestamp: str) -> int:
+    """
+    Convierte un tiempo MM:SS o HH:MM:SS (el formato de format_time) a segundos.
+    
+    Args:
+        timestamp: Tiempo formateado
+        
+    Returns:
+        Tiempo en segundos (0 si el formato no es MM:SS ni HH:MM:SS)
+    """
+    parts = timestamp.split(":")
+    if not 2 <= len(parts) <= 3:
+        return 0
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + int(part)
+    return seconds
+
 def are_tracks_similar(track1: dict, track2: dict, similarity_threshold: float = 0.85) -> bool:
     """
     Compara dos tracks para determinar si son similares basándose en título y artista.
     
     Args:
-        track1: Primer track a comparar
+        track1: Primer track a comparar (puede traer "title_lower"/"artist_lower" ya calculados)
         track2: Segundo track a comparar
         similarity_threshold: Umbral de similitud (0-1)
         
@@ -114,24 +339,60 @@ def are_tracks_similar(track1: dict, track2: dict, similarity_threshold: float =
     if not track1 or not track2:
         return False
 
-    # Extraer título y artista según la estructura esperada
-    title1 = track1.get("title", "")
-    artist1 = track1.get("artist", "")
+    # Se normaliza una vez por track y la comparación se cachea por par de firmas, así los
+    # pares que se repiten a lo largo de una mezcla solo se comparan una vez
+    return are_signatures_similar(_normalized_signature(track1), _normalized_signature(track2), similarity_threshold)
+
+def _normalized_signature(track: dict) -> Tuple[str, str]:
+    if "title_lower" in track and "artist_lower" in track:
+        return track["title_lower"], track["artist_lower"]
+    return track_signature(track)
+
+def track_signature(track: dict) -> Tuple[str, str]:
+    """
+    Firma normalizada (título, artista) de un track, para calcularla una sola vez por track.
     
-    title2 = track2.get("title", "")
-    artist2 = track2.get("artist", "")
+    Args:
+        track: Track con "title" y "artist"
+        
+    Returns:
+        Tuple con (título, artista) sin espacios en los extremos y en minúsculas
+    """
+    return (track.get("title") or "").strip().lower(), (track.get("artist") or "").strip().lower()
 
-    # Si alguno de los campos está vacío, no podemos comparar
-    if not title1 or not title2 or not artist1 or not artist2:
-        return False
+@functools.lru_cache(maxsize=4096)
+def _signature_similarity(sig1: Tuple[str, str], sig2: Tuple[str, str]) -> float:
+    # RapidFuzz devuelve 0-100; el título pesa más que el artista
+    title_similarity = fuzz.ratio(sig1[0], sig2[0]) / 100.0
+    artist_similarity = fuzz.ratio(sig1[1], sig2[1]) / 100.0
+    return (title_similarity * 0.7) + (artist_similarity * 0.3)
 
-    # Calcular similitud
-    title_similarity = difflib.SequenceMatcher(None, title1.lower(), title2.lower()).ratio()
-    artist_similarity = difflib.SequenceMatcher(None, artist1.lower(), artist2.lower()).ratio()
+def are_signatures_similar(sig1: Tuple[str, str], sig2: Tuple[str, str], similarity_threshold: float = 0.85) -> bool:
+    """
+    Equivalente a are_tracks_similar sobre firmas ya normalizadas (ver track_signature):
+    las firmas idénticas se resuelven sin comparación difusa y el resto se cachea por par.
+    
+    Args:
+        sig1: Firma del primer track
+        sig2: Firma del segundo track
+        similarity_threshold: Umbral de similitud (0-1)
+        
+    Returns:
+        True si los tracks son similares, False en caso contrario
+    """
+    if not all(sig1) or not all(sig2):
+        return False
+    if sig1 == sig2:
+        return True
+    # Cota superior sin comparar: fuzz.ratio es 1 - distancia_indel / (len1 + len2) y la
+    # distancia es al menos la diferencia de longitudes, así que ratio <= 2·min / (len1 + len2).
+    # Si ni con esas cotas se llega al umbral, no hace falta RapidFuzz
+    if _length_bound(sig1[0], sig2[0]) * 0.7 + _length_bound(sig1[1], sig2[1]) * 0.3 < similarity_threshold - 1e-9:
+        return False
+    return _signature_similarity(sig1, sig2) >= similarity_threshold
 
-    # Ponderación: título tiene más peso que artista
-    combined_similarity = (title_similarity * 0.7) + (artist_similarity * 0.3)
-    return combined_similarity >= similarity_threshold
+def _length_bound(a: str, b: str) -> float:
+    return 2.0 * min(len(a), len(b)) / (len(a) + len(b))
 
 class ExponentialBackoff:
     """
@@ -144,6 +405,9 @@ class ExponentialBackoff:
         self.jitter = jitter
         self.current_delay = initial_delay
         self.retry_count = 0
+        # Tabla de esperas exponenciales precalculada: es la espera de cada intento sin jitter
+        # y el techo de la espera con jitter
+        self._delays = [min(initial_delay * (1 << i), max_delay) for i in range(max_retries)]
 
     def get_next_delay(self):
         """
@@ -155,14 +419,14 @@ class ExponentialBackoff:
         if self.retry_count >= self.max_retries:
             return None
 
-        # Calcular el delay exponencial
-        delay = min(self.initial_delay * (2**self.retry_count), self.max_delay)
-
-        # Agregar jitter aleatorio (±20%)
         if self.jitter:
-            import random
-            jitter_amount = delay * 0.2
-            delay += random.uniform(-jitter_amount, jitter_amount)
+            # Jitter decorrelacionado: la espera depende de la anterior y no del número de intento,
+            # así los reintentos de corutinas que fallaron a la vez no se sincronizan. La tabla
+            # limita cada intento para que el jitter no salte directamente a max_delay
+            delay = min(self._delays[self.retry_count], random.uniform(self.initial_delay, self.current_delay * 3))
+        else:
+            delay = self._delays[self.retry_count]
+        self.current_delay = delay
 
         self.retry_count += 1
         return max(0.1, delay)  # Asegurar que el delay no sea menor a 0.1 segundos
@@ -172,4 +436,133 @@ class ExponentialBackoff:
         Reinicia el contador de reintentos.
         """
         self.current_delay = self.initial_delay
-        self.retry_count = 0 
\ No newline at end of file
+        self.retry_count = 0
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limita las peticiones simultáneas ajustando el límite al estilo del control de congestión TCP:
+    sube de uno en uno mientras las peticiones terminan bien y se reduce a la mitad cuando el
+    servicio responde con un error de sobrecarga. `is_overload` recibe la excepción y decide si
+    cuenta como sobrecarga (por defecto, cualquier Exception).
+    """
+    def __init__(self, is_overload=None, initial_concurrency=2, max_concurrency=16, min_concurrency=1):
+        self.is_overload = is_overload or (lambda exc: isinstance(exc, Exception))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = initial_concurrency
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self._in_flight -= 1
+            if exc is not None and self.is_overload(exc):
+                self.limit = max(self.min_concurrency, self.limit // 2)
+                self._successes = 0
+            elif exc_type is None:
+                # Incremento aditivo: +1 tras completar una "ventana" entera sin errores
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+        return False
+
+class RateLimiter:
+    """
+    Token bucket compartido por todas las corutinas que consultan un mismo servicio.
+    Las peticiones se espacian globalmente sin que cada una pague una espera fija.
+    """
+    def __init__(self, max_rate, time_period=1.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = max_rate
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Espera hasta que haya un token disponible y lo consume.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                elapsed = now - self._last_refill
+                self._last_refill = now
+                self._tokens = min(
+                    self.max_rate,
+                    self._tokens + elapsed * self.max_rate / self.time_period
+                )
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.time_period / self.max_rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+class ResultCache:
+    """
+    Caché de resultados indexada por hash del contenido del chunk: mantiene los más recientes
+    en memoria y guarda cada entrada como un archivo JSON en disco para reutilizarla entre ejecuciones.
+    get y set hacen E/S de disco: desde código asíncrono se llaman con asyncio.to_thread.
+    """
+    def __init__(self, directory, memo_size=1024):
+        self.directory = directory
+        self.memo_size = memo_size
+        self._memo = {}
+        # La memoria se comparte entre los hilos de asyncio.to_thread
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Devuelve el valor cacheado para la clave (memoria y después disco) o `default` si no existe.
+        """
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        try:
+            with open(os.path.join(self.directory, f"{key}.json"), "rb") as f:
+                value = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return default
+        self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        """
+        Guarda el valor (serializable a JSON) en memoria y en disco. El archivo se escribe
+        aparte y se mueve a su sitio con os.replace, así que nunca queda una entrada a medias.
+        """
+        self._remember(key, value)
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(orjson.dumps(value))
+            os.replace(tmp_path, os.path.join(self.directory, f"{key}.json"))
+        except (OSError, TypeError) as e:
+            logger.warning(f"No se pudo guardar el resultado en caché: {str(e)}")
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _remember(self, key, value):
+        with self._lock:
+            if key not in self._memo and len(self._memo) >= self.memo_size:
+                self._memo.pop(next(iter(self._memo)))
+            self._memo[key] = value 
\ No newline at end of file
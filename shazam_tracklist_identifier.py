@@ -1,18 +1,28 @@
 import os
+import sys
 import asyncio
 import traceback
 import yt_dlp
 import logging
 import time
-import random
-import difflib
-import json
+from rapidfuzz import fuzz
+import functools
+import hashlib
+import io
+import itertools
+import operator
+import orjson
 import argparse
+import wave
+import numpy as np
 from pathlib import Path
+from dataclasses import dataclass
 from datetime import timedelta
-from pydub import AudioSegment
 from shazamio import Shazam
-from aiohttp import ClientError, ContentTypeError
+
+# Reintentos, limitador de concurrencia y cliente HTTP compartidos con ShazamRecognizer
+from recognizers.utils import ExponentialBackoff, AdaptiveConcurrencyLimiter
+from recognizers.shazam_recognizer import PooledHTTPClient, is_retryable_error
 
 # Configuración de logging
 logging.basicConfig(
@@ -22,223 +32,312 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Formato PCM de los chunks en memoria: Shazam calcula la firma sobre audio mono a 16 kHz
+CHUNK_SAMPLE_RATE = 16000
+CHUNK_CHANNELS = 1
+CHUNK_SAMPLE_WIDTH = 2
+# Energía RMS (escala int16) por debajo de la cual un chunk se considera silencio y no se reconoce
+SILENCE_RMS_THRESHOLD = 100
+# Similitud mínima (0-1) para considerar que dos identificaciones son el mismo track
+SIMILARITY_THRESHOLD = 0.85
+# Respuestas de Shazam guardadas por hash del chunk para no repetir consultas entre ejecuciones
+SHAZAM_CACHE_DIR = ".shazam_cache"
 
-class ExponentialBackoff:
-    def __init__(self, initial_delay=1, max_delay=60, max_retries=5, jitter=True):
-        self.initial_delay = initial_delay
-        self.max_delay = max_delay
-        self.max_retries = max_retries
-        self.jitter = jitter
-        self.current_delay = initial_delay
-        self.retry_count = 0
 
-    def get_next_delay(self):
-        if self.retry_count >= self.max_retries:
-            return None
+def extract_audio_info(url):
+    logger.info(f"Extrayendo información del video: {url}")
+    with yt_dlp.YoutubeDL({"quiet": True}) as ydl:
+        return ydl.extract_info(url, download=False)
 
-        # Calcular el delay exponencial
-        delay = min(self.initial_delay * (2**self.retry_count), self.max_delay)
 
-        # Agregar jitter aleatorio (±20%)
-        if self.jitter:
-            jitter_amount = delay * 0.2
-            delay += random.uniform(-jitter_amount, jitter_amount)
+def pcm_rms(pcm):
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    if samples.size == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(samples * samples)))
 
-        self.retry_count += 1
-        return max(0.1, delay)  # Asegurar que el delay no sea menor a 0.1 segundos
 
-    def reset(self):
-        self.current_delay = self.initial_delay
-        self.retry_count = 0
+def pcm_to_wav(pcm):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(CHUNK_CHANNELS)
+        wav.setsampwidth(CHUNK_SAMPLE_WIDTH)
+        wav.setframerate(CHUNK_SAMPLE_RATE)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
 
 
-def download_audio(url):
-    logger.info(f"Iniciando descarga de audio desde URL: {url}")
-    ydl_opts = {
-        "format": "bestaudio/best",
-        "postprocessors": [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }
-        ],
-        "outtmpl": "downloaded_audio.%(ext)s",
-        "quiet": True,
-    }
+async def iter_audio_chunks(url, chunk_duration=30):
+    """
+    Genera los chunks del audio como (bytes WAV, energía RMS) a medida que se descargan.
+    yt-dlp escribe el stream en una tubería, ffmpeg lo decodifica una sola vez a PCM y cada
+    chunk se corta leyendo un número fijo de bytes de su salida: no se escribe ningún archivo
+    en disco.
+    """
+    logger.info(f"Iniciando descarga y división del audio en chunks de {chunk_duration} segundos")
+    chunk_size = chunk_duration * CHUNK_SAMPLE_RATE * CHUNK_CHANNELS * CHUNK_SAMPLE_WIDTH
 
+    downloader = decoder = None
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            logger.info("Extrayendo información del video...")
-            info = ydl.extract_info(url, download=True)
-            filename = ydl.prepare_filename(info)
-            base, ext = os.path.splitext(filename)
-            final_filename = f"{base}.mp3"
-            logger.info(f"Audio descargado exitosamente: {final_filename}")
-            return final_filename, info.get("title", "Unknown")
+        read_fd, write_fd = os.pipe()
+        try:
+            downloader = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "yt_dlp", "--quiet", "-f", "bestaudio/best", "-o", "-", url,
+                stdout=write_fd,
+            )
+            decoder = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-vn",
+                "-f", "s16le", "-ac", str(CHUNK_CHANNELS), "-ar", str(CHUNK_SAMPLE_RATE), "pipe:1",
+                stdin=read_fd,
+                stdout=asyncio.subprocess.PIPE,
+            )
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+        count = 0
+        while True:
+            try:
+                pcm = await decoder.stdout.readexactly(chunk_size)
+            except asyncio.IncompleteReadError as e:
+                # Último chunk, más corto que el resto
+                pcm = e.partial
+            if not pcm:
+                break
+            count += 1
+            yield pcm_to_wav(pcm), pcm_rms(pcm)
+            if len(pcm) < chunk_size:
+                break
+
+        download_code, decode_code = await asyncio.gather(downloader.wait(), decoder.wait())
+        if download_code != 0:
+            raise Exception(f"yt-dlp terminó con código {download_code}")
+        if decode_code != 0:
+            raise Exception(f"ffmpeg terminó con código {decode_code}")
+        logger.info(f"División de audio completada. {count} chunks creados")
     except Exception as e:
-        logger.error(f"Error durante la descarga del audio: {str(e)}")
+        logger.error(f"Error durante la descarga y división del audio: {str(e)}")
         raise
+    finally:
+        # Si ffmpeg no llegó a arrancar, el proceso de yt-dlp también se mata y se espera
+        for proc in (downloader, decoder):
+            if proc is not None and proc.returncode is None:
+                proc.kill()
+                await proc.wait()
 
 
-def split_audio(audio_path, chunk_duration=30):
-    logger.info(f"Iniciando división del audio en chunks de {chunk_duration} segundos")
+def read_cached_result(cache_path):
+    """Devuelve la entrada cacheada ({"result": ...}) o None si no existe o no se puede leer"""
     try:
-        audio = AudioSegment.from_file(audio_path)
-        chunk_ms = chunk_duration * 1000
-        chunks = []
-
-        total_chunks = len(audio) // chunk_ms + (1 if len(audio) % chunk_ms else 0)
-        logger.info(f"Total de chunks a crear: {total_chunks}")
-
-        for i in range(0, len(audio), chunk_ms):
-            chunk = audio[i : i + chunk_ms]
-            chunk_name = f"chunk_{i//1000:04d}.mp3"
-            chunk.export(chunk_name, format="mp3")
-            chunks.append(chunk_name)
-            logger.debug(f"Chunk creado: {chunk_name}")
-
-        logger.info(f"División de audio completada. {len(chunks)} chunks creados")
-        return chunks, len(audio) // 1000  # Return chunks and total duration in seconds
-    except Exception as e:
-        logger.error(f"Error durante la división del audio: {str(e)}")
-        raise
-
+        with open(cache_path, "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
 
-async def recognize_chunk(shazam, chunk_path, backoff=None):
-    logger.info(f"Iniciando reconocimiento de chunk: {chunk_path}")
-    if backoff is None:
-        logger.info("Creando nuevo backoff")
-        backoff = ExponentialBackoff()
 
+def write_cached_result(cache_path, result):
+    """Guarda la entrada en un archivo aparte y la mueve a su sitio: nunca queda un JSON a medias"""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
     try:
-        logger.info("Esperando 5 segundos")
-        await asyncio.sleep(5)
-        logger.info("Reconociendo chunk")
-        result = await shazam.recognize(chunk_path)
-        logger.info("Reconocimiento completado")
-
-        if not result or "matches" not in result or not result["matches"]:
-            logger.warning(f"No se encontraron matches en {chunk_path}")
-            return None
-
-        if result and "track" in result:
-            logger.info(
-                f"Canción identificada en {chunk_path}: {result['track']['title']} - {result['track']['subtitle']}"
-            )
-            backoff.reset()
-        else:
-            logger.warning(f"No se pudo identificar la canción en {chunk_path}")
-            logger.info(f"Result: {result}")
-        return result
-    except (ClientError, ContentTypeError) as e:
-        next_delay = backoff.get_next_delay()
-        if next_delay is not None:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps({"result": result}))
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning("No se pudo guardar el resultado en caché: %s", e)
+
+
+async def recognize_chunk(shazam, chunk, limiter, chunk_name, cache_path=None):
+    logger.info("Iniciando reconocimiento de chunk: %s", chunk_name)
+    if cache_path:
+        cached = await asyncio.to_thread(read_cached_result, cache_path)
+        # Las entradas sin match de versiones anteriores se ignoran y se vuelven a consultar
+        if cached is not None and cached.get("result") is not None:
+            logger.info("Resultado en caché para %s", chunk_name)
+            return cached["result"]
+
+    # Un único backoff gobierna todos los reintentos del chunk
+    backoff = ExponentialBackoff()
+
+    # La firma se calcula en local una sola vez, fuera del limitador; los reintentos solo
+    # reenvían la petición
+    try:
+        signature = await shazam.core_recognizer.recognize_bytes(value=chunk)
+    except Exception as e:
+        logger.error("Error generando la firma de %s: %s", chunk_name, e)
+        return None
+
+    while True:
+        try:
+            logger.info("Reconociendo chunk")
+            async with limiter:
+                result = await shazam.send_recognize_request_v2(sig=signature)
+            logger.info("Reconocimiento completado")
+        except Exception as e:
+            # Los errores no recuperables (4xx distintos de 429, datos inválidos) no se reintentan
+            if not is_retryable_error(e):
+                logger.error("Error procesando %s: %s", chunk_name, e)
+                logger.error(traceback.format_exc())
+                return None
+            next_delay = backoff.get_next_delay()
+            if next_delay is None:
+                logger.error("Error máximo de reintentos alcanzado para %s", chunk_name)
+                logger.error("Error: %s", e)
+                logger.error(traceback.format_exc())
+                return None
             logger.warning(
-                f"Error de conexión en {chunk_path}. Reintentando en {next_delay:.1f} segundos... (Intento {backoff.retry_count}/{backoff.max_retries})"
+                "Error de conexión en %s. Reintentando en %.1f segundos... (Intento %d/%d)",
+                chunk_name,
+                next_delay,
+                backoff.retry_count,
+                backoff.max_retries,
             )
             await asyncio.sleep(next_delay)
-            return await recognize_chunk(shazam, chunk_path, backoff)
-        else:
-            logger.error(f"Error máximo de reintentos alcanzado para {chunk_path}")
-            logger.error(f"Error: {str(e)}")
-            logger.error(traceback.format_exc())
-            return None
-    except Exception as e:
-        logger.error(f"Error procesando {chunk_path}: {str(e)}")
-        logger.error(traceback.format_exc())
+            continue
+        break
+
+    if not result or "matches" not in result or not result["matches"]:
+        logger.warning("No se encontraron matches en %s", chunk_name)
         return None
 
+    if "track" in result:
+        # Solo se cachean los matches: un chunk sin match se vuelve a consultar en la próxima
+        # ejecución, por si Shazam ha incorporado el track a su catálogo
+        if cache_path:
+            await asyncio.to_thread(write_cached_result, cache_path, result)
+        logger.info(
+            "Canción identificada en %s: %s - %s",
+            chunk_name,
+            result["track"]["title"],
+            result["track"]["subtitle"],
+        )
+    else:
+        logger.warning("No se pudo identificar la canción en %s", chunk_name)
+        logger.debug("Result: %s", result)
+    return result
+
 
+@functools.lru_cache(maxsize=4096)
 def format_time(seconds):
-    mins, secs = divmod(seconds, 60)
+    mins, secs = divmod(int(seconds), 60)
     hours, mins = divmod(mins, 60)
     if hours > 0:
         return f"{hours:02d}:{mins:02d}:{secs:02d}"
     return f"{mins:02d}:{secs:02d}"
 
 
-def are_tracks_similar(track1, track2, similarity_threshold=0.85):
+def tracks_similarity(title1, artist1, title2, artist2):
+    """Similitud combinada (0-1) entre dos tracks con título y artista ya en minúsculas"""
+    # Los campos idénticos no necesitan pasar por fuzz.ratio
+    title_similarity = 1.0 if title1 == title2 else fuzz.ratio(title1, title2) / 100.0
+    artist_similarity = 1.0 if artist1 == artist2 else fuzz.ratio(artist1, artist2) / 100.0
+    return (title_similarity * 0.7) + (artist_similarity * 0.3)
+
+
+def length_bound(a, b):
+    """Cota superior de fuzz.ratio (0-1) a partir solo de las longitudes"""
+    total = len(a) + len(b)
+    return 2.0 * min(len(a), len(b)) / total if total else 1.0
+
+
+def are_tracks_similar(track1, track2, similarity_threshold=SIMILARITY_THRESHOLD):
     if not track1 or not track2:
         return False
 
-    title_similarity = difflib.SequenceMatcher(
-        None, track1["title"].lower(), track2["title"].lower()
-    ).ratio()
-    artist_similarity = difflib.SequenceMatcher(
-        None, track1["artist"].lower(), track2["artist"].lower()
-    ).ratio()
+    # Se usan las versiones en minúsculas precalculadas si el track las trae
+    title1 = track1.get("title_lower") or track1["title"].lower()
+    artist1 = track1.get("artist_lower") or track1["artist"].lower()
+    title2 = track2.get("title_lower") or track2["title"].lower()
+    artist2 = track2.get("artist_lower") or track2["artist"].lower()
 
-    combined_similarity = (title_similarity * 0.7) + (artist_similarity * 0.3)
-    return combined_similarity >= similarity_threshold
+    return lowered_tracks_similar(title1, artist1, title2, artist2, similarity_threshold)
 
 
-def compile_tracklist(
-    results, chunk_duration, min_duration_seconds=60, max_interruption_chunks=2
-):
-    logger.info("Iniciando compilación de tracklist mejorada")
-    raw_tracks = []
-
-    for i, result in enumerate(results):
-        track = None
-        if result and "track" in result and "title" in result["track"]:
-            track = {
-                "title": result["track"]["title"],
-                "artist": result["track"]["subtitle"],
-                "chunk_index": i,
-                "timestamp": i * chunk_duration,
-            }
-            raw_tracks.append(track)
+def lowered_tracks_similar(title1, artist1, title2, artist2, similarity_threshold=SIMILARITY_THRESHOLD):
+    """Compara dos tracks con título y artista ya en minúsculas"""
+    if title1 == title2 and artist1 == artist2:
+        return True
+    # fuzz.ratio <= 2·min / (len1 + len2): si con esa cota no se llega al umbral, no se compara
+    if length_bound(title1, title2) * 0.7 + length_bound(artist1, artist2) * 0.3 < similarity_threshold - 1e-9:
+        return False
+    return tracks_similarity(title1, artist1, title2, artist2) >= similarity_threshold
 
-    consolidated_tracks = []
-    current_group = []
 
-    for track in raw_tracks:
-        if not current_group:
-            current_group.append(track)
-            continue
+@dataclass(slots=True)
+class TrackGroup:
+    """Tramo de chunks consecutivos identificados como el mismo track"""
 
-        last_track = current_group[-1]
-        chunks_between = track["chunk_index"] - last_track["chunk_index"] - 1
+    title: str
+    artist: str
+    title_lower: str
+    artist_lower: str
+    first_index: int
+    last_index: int
 
-        if chunks_between <= max_interruption_chunks and are_tracks_similar(
-            track, current_group[0]
-        ):
-            current_group.append(track)
-        else:
-            if current_group:
-                consolidated_tracks.append(current_group)
-            current_group = [track]
 
-    if current_group:
-        consolidated_tracks.append(current_group)
+def compile_tracklist(
+    results, chunk_duration, min_duration_seconds=60, max_interruption_chunks=2
+):
+    logger.info("Iniciando compilación de tracklist mejorada")
+    keys = [
+        (result["track"]["title"], result["track"]["subtitle"])
+        if result and "track" in result and "title" in result["track"]
+        else None
+        for result in results
+    ]
+
+    # Los chunks consecutivos con la misma clave se agrupan con groupby; la similitud difusa
+    # solo se calcula una vez por tramo, en la frontera con el grupo anterior.
+    groups = []
+    for key, run in itertools.groupby(enumerate(keys), key=operator.itemgetter(1)):
+        if key is None:
+            continue
+        run = list(run)
+        first_index, last_index = run[0][0], run[-1][0]
+        title, artist = key
+        title_lower, artist_lower = title.lower(), artist.lower()
+
+        if groups:
+            group = groups[-1]
+            chunks_between = first_index - group.last_index - 1
+            if chunks_between <= max_interruption_chunks and (
+                (title == group.title and artist == group.artist)
+                or lowered_tracks_similar(
+                    title_lower, artist_lower, group.title_lower, group.artist_lower
+                )
+            ):
+                group.last_index = last_index
+                continue
+
+        groups.append(
+            TrackGroup(title, artist, title_lower, artist_lower, first_index, last_index)
+        )
 
     final_tracklist = []
 
-    for group in consolidated_tracks:
-        if len(group) == 0:
-            continue
-
-        start_time = group[0]["timestamp"]
-        end_time = group[-1]["timestamp"] + chunk_duration
+    for group in groups:
+        start_time = group.first_index * chunk_duration
+        end_time = group.last_index * chunk_duration + chunk_duration
         duration = end_time - start_time
 
         if duration >= min_duration_seconds:
-            representative_track = group[0]
             final_tracklist.append(
                 {
                     "start": start_time,
                     "end": end_time,
                     "duration": duration,
+                    # Los tiempos formateados se calculan una vez aquí y los reutilizan todos los exportadores
+                    "start_formatted": format_time(start_time),
+                    "duration_formatted": format_time(duration),
                     "track": {
-                        "title": representative_track["title"],
-                        "artist": representative_track["artist"],
+                        "title": group.title,
+                        "artist": group.artist,
                     },
                 }
             )
 
     logger.info(
-        f"Tracklist consolidada: {len(final_tracklist)} tracks (filtradas de {len(consolidated_tracks)} identificaciones)"
+        f"Tracklist consolidada: {len(final_tracklist)} tracks (filtradas de {len(groups)} identificaciones)"
     )
     return final_tracklist
 
@@ -248,10 +347,13 @@ def export_tracklist_to_console(tracklist):
     logger.info("\nTracklist identificado:")
 
     for i, entry in enumerate(tracklist, 1):
-        start = format_time(entry["start"])
-        duration = format_time(entry["duration"])
         logger.info(
-            f"{i:02d}. [{start}] ({duration}) - {entry['track']['title']} by {entry['track']['artist']}"
+            "%02d. [%s] (%s) - %s by %s",
+            i,
+            entry["start_formatted"],
+            entry["duration_formatted"],
+            entry["track"]["title"],
+            entry["track"]["artist"],
         )
 
 
@@ -262,9 +364,8 @@ def export_tracklist_to_text(tracklist, output_file, video_title=None):
             f.write(f"# Tracklist for: {video_title}\n\n")
 
         for i, entry in enumerate(tracklist, 1):
-            start = format_time(entry["start"])
             f.write(
-                f"{i:02d}. [{start}] {entry['track']['title']} - {entry['track']['artist']}\n"
+                f"{i:02d}. [{entry['start_formatted']}] {entry['track']['title']} - {entry['track']['artist']}\n"
             )
 
     logger.info(f"Tracklist exportado a archivo de texto: {output_file}")
@@ -286,16 +387,17 @@ def export_tracklist_to_json(tracklist, output_file, video_info=None):
             {
                 "number": i,
                 "start_time": entry["start"],
-                "start_time_formatted": format_time(entry["start"]),
+                "start_time_formatted": entry["start_formatted"],
                 "duration": entry["duration"],
-                "duration_formatted": format_time(entry["duration"]),
+                "duration_formatted": entry["duration_formatted"],
                 "title": entry["track"]["title"],
                 "artist": entry["track"]["artist"],
             }
         )
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, indent=2, ensure_ascii=False)
+    # orjson serializa directamente a bytes UTF-8 (sin escapar caracteres no ASCII)
+    with open(output_file, "wb") as f:
+        f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
 
     logger.info(f"Tracklist exportado a archivo JSON: {output_file}")
 
@@ -332,9 +434,8 @@ def export_tracklist_to_cue(
     logger.info(f"Tracklist exportado a archivo CUE: {output_file}")
 
 
-def export_tracklist_to_html(tracklist, output_file, video_title=None, video_url=None):
-    """Export tracklist to a HTML file with 1001Tracklists-like formatting"""
-    html_content = """
+# Plantillas del export HTML: la cabecera es fija y el bloque de cada track se rellena con format()
+HTML_HEADER = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -413,26 +514,9 @@ def export_tracklist_to_html(tracklist, output_file, video_title=None, video_url
     <body>
     """
 
-    # Add title
-    if video_title:
-        html_content += f"<h1>Tracklist: {video_title}</h1>\n"
-    else:
-        html_content += "<h1>DJ Set Tracklist</h1>\n"
-
-    # Add source link if available
-    if video_url:
-        html_content += f'<div class="source-link">Source: <a href="{video_url}" target="_blank">{video_url}</a></div>\n'
-
-    # Add tracks
-    for i, entry in enumerate(tracklist, 1):
-        start_time = format_time(entry["start"])
-        duration = format_time(entry["duration"])
-        title = entry["track"]["title"]
-        artist = entry["track"]["artist"]
-
-        html_content += f"""
+HTML_TRACK_TEMPLATE = """
         <div class="track-container">
-            <div class="track-number">{i:02d}</div>
+            <div class="track-number">{number:02d}</div>
             <div class="track-time">{start_time}</div>
             <div class="track-info">
                 <div class="track-title">{title}</div>
@@ -442,17 +526,47 @@ def export_tracklist_to_html(tracklist, output_file, video_title=None, video_url
         </div>
         """
 
-    # Add footer
-    html_content += f"""
+HTML_FOOTER_TEMPLATE = """
     <div class="footer">
-        <p>Generated on {time.strftime('%Y-%m-%d %H:%M:%S')} by DJ Set Track Identifier</p>
+        <p>Generated on {generated_at} by DJ Set Track Identifier</p>
     </div>
     </body>
     </html>
     """
 
+
+def export_tracklist_to_html(tracklist, output_file, video_title=None, video_url=None):
+    """Export tracklist to a HTML file with 1001Tracklists-like formatting"""
+    # Las partes se acumulan en una lista y se unen una sola vez al final
+    parts = [HTML_HEADER]
+
+    # Add title
+    if video_title:
+        parts.append(f"<h1>Tracklist: {video_title}</h1>\n")
+    else:
+        parts.append("<h1>DJ Set Tracklist</h1>\n")
+
+    # Add source link if available
+    if video_url:
+        parts.append(f'<div class="source-link">Source: <a href="{video_url}" target="_blank">{video_url}</a></div>\n')
+
+    # Add tracks
+    for i, entry in enumerate(tracklist, 1):
+        parts.append(
+            HTML_TRACK_TEMPLATE.format(
+                number=i,
+                start_time=entry["start_formatted"],
+                title=entry["track"]["title"],
+                artist=entry["track"]["artist"],
+                duration=entry["duration_formatted"],
+            )
+        )
+
+    # Add footer
+    parts.append(HTML_FOOTER_TEMPLATE.format(generated_at=time.strftime('%Y-%m-%d %H:%M:%S')))
+
     with open(output_file, "w", encoding="utf-8") as f:
-        f.write(html_content)
+        f.write("".join(parts))
 
     logger.info(f"Tracklist exportado a archivo HTML: {output_file}")
 
@@ -492,7 +606,7 @@ def export_tracklist(
         export_tracklist_to_html(tracklist, output_file, video_title, video_url)
 
 
-async def main(url, chunk_duration=30, output_formats=None, output_dir=None):
+async def main(url, chunk_duration=30, output_formats=None, output_dir=None, use_cache=True):
     logger.info("Iniciando proceso principal")
 
     if output_dir:
@@ -502,35 +616,62 @@ async def main(url, chunk_duration=30, output_formats=None, output_dir=None):
     if output_dir:
         base_filename = os.path.join(output_dir, base_filename)
 
+    http_client = PooledHTTPClient()
     try:
-        # Descargar audio
-        audio_path, video_title = await asyncio.to_thread(download_audio, url)
-        logger.info(f"Audio descargado: {audio_path}")
-
-        # Dividir en chunks
-        chunks, total_duration = split_audio(audio_path, chunk_duration)
-        logger.info(f"Audio dividido en {len(chunks)} chunks")
+        info = await asyncio.to_thread(extract_audio_info, url)
+        video_title = info.get("title", "Unknown")
 
-        # Procesar reconocimiento
         logger.info("Iniciando reconocimiento de canciones con Shazam")
-        shazam = Shazam()
-
-        # Procesar chunks en grupos más pequeños para evitar sobrecarga
-        chunk_size = 3
-        results = []
-        for i in range(0, len(chunks), chunk_size):
-            chunk_group = chunks[i : i + chunk_size]
-            logger.info(
-                f"Procesando grupo de chunks {i//chunk_size + 1}/{(len(chunks) + chunk_size - 1)//chunk_size}"
-            )
-            tasks = [recognize_chunk(shazam, chunk) for chunk in chunk_group]
-            group_results = await asyncio.gather(*tasks)
-            results.extend(group_results)
+        shazam = Shazam(http_client=http_client)
+
+        # El limitador decide cuántos reconocimientos hay en vuelo
+        limiter = AdaptiveConcurrencyLimiter(
+            is_overload=is_retryable_error,
+            initial_concurrency=2,
+            max_concurrency=16,
+        )
+
+        # Cada chunk se empieza a reconocer en cuanto sale de ffmpeg, mientras la descarga
+        # continúa. Los chunks idénticos (silencios, intros repetidas) comparten una sola tarea.
+        tasks_by_digest = {}
+        chunk_tasks = []
+        silent_chunks = 0
+        try:
+            async for chunk, rms in iter_audio_chunks(url, chunk_duration):
+                # Los chunks en silencio nunca dan match: no se envían a Shazam
+                if rms < SILENCE_RMS_THRESHOLD:
+                    silent_chunks += 1
+                    chunk_tasks.append(None)
+                    continue
+                digest = hashlib.blake2b(chunk, digest_size=16).digest()
+                task = tasks_by_digest.get(digest)
+                if task is None:
+                    task = asyncio.create_task(
+                        recognize_chunk(
+                            shazam,
+                            chunk,
+                            limiter,
+                            f"chunk_{len(chunk_tasks):04d}",
+                            os.path.join(SHAZAM_CACHE_DIR, f"{digest.hex()}.json") if use_cache else None,
+                        )
+                    )
+                    tasks_by_digest[digest] = task
+                chunk_tasks.append(task)
+        except BaseException:
+            for task in tasks_by_digest.values():
+                task.cancel()
+            # Esperar a que terminen de cancelarse para no dejar tareas ni excepciones sueltas
+            await asyncio.gather(*tasks_by_digest.values(), return_exceptions=True)
+            raise
+        logger.info(
+            f"Audio dividido en {len(chunk_tasks)} chunks "
+            f"({len(tasks_by_digest)} únicos, {silent_chunks} en silencio)"
+        )
 
-            # Pausa entre grupos con jitter
-            if i + chunk_size < len(chunks):
-                delay = 2 + random.uniform(0, 2)
-                await asyncio.sleep(delay)
+        recognized = iter(
+            await asyncio.gather(*(task for task in chunk_tasks if task is not None))
+        )
+        results = [next(recognized) if task is not None else None for task in chunk_tasks]
 
         # Generar tracklist
         tracklist = compile_tracklist(results, chunk_duration)
@@ -544,22 +685,16 @@ async def main(url, chunk_duration=30, output_formats=None, output_dir=None):
                 base_filename=base_filename,
                 video_title=video_title,
                 video_url=url,
-                audio_file_path=audio_path,
             )
 
-        # Limpieza
-        logger.info("Iniciando limpieza de archivos temporales")
-        os.remove(audio_path)
-        for chunk in chunks:
-            os.remove(chunk)
-        logger.info("Limpieza completada")
-
         return tracklist
 
     except Exception as e:
         logger.error(f"Error en el proceso principal: {str(e)}")
         logger.error(traceback.format_exc())
         raise
+    finally:
+        await http_client.aclose()
 
 
 def parse_arguments():
@@ -585,6 +720,11 @@ def parse_arguments():
         default="txt,json,html,cue",
         help="Comma-separated list of output formats (options: txt,json,html,cue) (default: txt,json,html,cue)",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore the local cache of Shazam matches",
+    )
 
     args = parser.parse_args()
 
@@ -596,15 +736,15 @@ def parse_arguments():
     # Add console output by default
     formats.append("console")
 
-    return args.url, args.chunk_duration, formats, args.output_dir
+    return args.url, args.chunk_duration, formats, args.output_dir, not args.no_cache
 
 
 if __name__ == "__main__":
     try:
-        url, chunk_duration, output_formats, output_dir = parse_arguments()
+        url, chunk_duration, output_formats, output_dir, use_cache = parse_arguments()
         logger.info(f"Script iniciado con URL: {url}")
         logger.info(f"Formatos de salida: {output_formats}")
-        asyncio.run(main(url, chunk_duration, output_formats, output_dir))
+        asyncio.run(main(url, chunk_duration, output_formats, output_dir, use_cache))
     except KeyboardInterrupt:
         logger.info("Proceso interrumpido por el usuario")
     except Exception as e:
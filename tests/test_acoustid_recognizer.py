@@ -0,0 +1,59 @@
+import asyncio
+
+from recognizers.acoustid_recognizer import AcoustIDRecognizer, parse_fpcalc_json
+
+# Salida capturada de `fpcalc -json chunk_0000.mp3 chunk_0001.mp3 chunk_0002.mp3` (Chromaprint 1.5),
+# con la tercera ruta ilegible: fpcalc avisa por stderr y solo imprime dos objetos
+FPCALC_MULTI_FILE_OUTPUT = (
+    b'{"duration": 60.00, "fingerprint": "AQADtEmUaEmSRMmD"}\n'
+    b'{"duration": 59.98, "fingerprint": "AQADtNGSSEkSJcmC"}\n'
+)
+
+
+def test_parse_fpcalc_json_keeps_argument_order():
+    assert parse_fpcalc_json(FPCALC_MULTI_FILE_OUTPUT) == [
+        (60.0, "AQADtEmUaEmSRMmD"),
+        (59.98, "AQADtNGSSEkSJcmC"),
+    ]
+
+
+def test_parse_fpcalc_json_skips_blank_and_invalid_lines():
+    output = b'\r\n{"duration": 30.00, "fingerprint": "AQAD"}\r\nERROR: could not open\n{"duration": 1}\n'
+    assert parse_fpcalc_json(output) == [(30.0, "AQAD")]
+
+
+def test_fpcalc_batch_falls_back_to_single_runs_on_count_mismatch():
+    recognizer = AcoustIDRecognizer()
+    chunks = ["chunk_0000.mp3", "chunk_0001.mp3", "chunk_0002.mp3"]
+    calls = []
+
+    async def fake_run_fpcalc(paths):
+        calls.append(list(paths))
+        if len(paths) > 1:
+            return parse_fpcalc_json(FPCALC_MULTI_FILE_OUTPUT)
+        if paths[0] == "chunk_0002.mp3":
+            return []
+        return [(60.0, f"fp-{paths[0]}")]
+
+    recognizer._run_fpcalc = fake_run_fpcalc
+    fingerprints = asyncio.run(recognizer._fpcalc_batch(chunks))
+
+    assert calls[0] == chunks
+    assert fingerprints == {
+        "chunk_0000.mp3": (60.0, "fp-chunk_0000.mp3"),
+        "chunk_0001.mp3": (60.0, "fp-chunk_0001.mp3"),
+    }
+
+
+def test_fpcalc_batch_maps_results_by_argument_order():
+    recognizer = AcoustIDRecognizer()
+    chunks = ["chunk_0000.mp3", "chunk_0001.mp3"]
+
+    async def fake_run_fpcalc(paths):
+        return parse_fpcalc_json(FPCALC_MULTI_FILE_OUTPUT)
+
+    recognizer._run_fpcalc = fake_run_fpcalc
+    assert asyncio.run(recognizer._fpcalc_batch(chunks)) == {
+        "chunk_0000.mp3": (60.0, "AQADtEmUaEmSRMmD"),
+        "chunk_0001.mp3": (59.98, "AQADtNGSSEkSJcmC"),
+    }